@@ -1,395 +1,2935 @@
-from flask import Flask, render_template, jsonify, request
-import yfinance as yf
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from urllib.parse import parse_qs
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 import numpy as np
 from datetime import datetime, timedelta
-import time
 import random
 import requests
+from requests.adapters import HTTPAdapter
 import json
-import nltk
+import importlib
+import importlib.util
+import gzip
+import logging
+import bisect
 import os
-from textblob import TextBlob
-from nltk.sentiment import SentimentIntensityAnalyzer
+import threading
+import sys
+import atexit
+import queue
+import warnings
+import hashlib
+import contextlib
+import socket
+import csv
+import math
+import sqlite3
+import uuid
+import tempfile
+from urllib.parse import urlparse
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 
 load_dotenv()
 
-try:
-    nltk.data.find('vader_lexicon')
-except LookupError:
-    nltk.download('vader_lexicon')
+# LOG_LEVEL=DEBUG brings back the per-symbol progress lines; the default only
+# logs refresh cycles, warnings and errors.
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger('financegpt')
+
+class LazyModule:
+    # Imports the real module on first attribute access, so worker boot does
+    # not pay for yfinance/pandas and nltk until something actually uses them.
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+    
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    self._module = importlib.import_module(self._name)
+                    logger.debug("📦 Loaded %s in %.0fms", self._name, (time.perf_counter() - started) * 1000)
+        return self._module
+    
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+yf = LazyModule('yfinance')
+nltk = LazyModule('nltk')
+nltk_sentiment = LazyModule('nltk.sentiment')
+textblob = LazyModule('textblob')
+# Only needed by the async service mode (asgi_app).
+httpx = LazyModule('httpx')
+# Optional: only needed for ?format=msgpack / Accept: application/msgpack.
+msgpack = LazyModule('msgpack')
+
+NLTK_DATA_DIR = os.getenv('NLTK_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data'))
+
+def ensure_vader_lexicon(allow_download=None):
+    if allow_download is None:
+        allow_download = os.getenv('NLTK_ALLOW_DOWNLOAD', '0') == '1'
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    
+    try:
+        nltk.data.find('sentiment/vader_lexicon.zip')
+        return True
+    except LookupError:
+        if not allow_download:
+            return False
+    
+    logger.info(f"⬇️ Downloading vader_lexicon into {NLTK_DATA_DIR}...")
+    return nltk.download('vader_lexicon', download_dir=NLTK_DATA_DIR, quiet=True)
+
+def vader_lexicon_on_disk():
+    # Looks in nltk's usual data directories without importing nltk, so the
+    # check stays out of the import-time budget.
+    directories = [NLTK_DATA_DIR, *filter(None, os.getenv('NLTK_DATA', '').split(os.pathsep)),
+                   os.path.expanduser('~/nltk_data'), os.path.join(sys.prefix, 'nltk_data'),
+                   os.path.join(sys.prefix, 'share', 'nltk_data'), os.path.join(sys.prefix, 'lib', 'nltk_data'),
+                   '/usr/share/nltk_data', '/usr/local/share/nltk_data', '/usr/lib/nltk_data', '/usr/local/lib/nltk_data']
+    return any(os.path.exists(os.path.join(directory, 'sentiment', 'vader_lexicon.zip')) for directory in directories)
+
+if not vader_lexicon_on_disk() and os.getenv('NLTK_ALLOW_DOWNLOAD', '0') != '1':
+    logger.warning("⚠️ VADER lexicon not found - sentiment will be scored with TextBlob only. "
+                   "Run `flask warm-up` or set NLTK_ALLOW_DOWNLOAD=1 to fetch it.")
+
+STARTUP = {'import_seconds': None, 'first_request_seconds': None, 'warm_up_seconds': None}
 
 app = Flask(__name__)
 
-class MarketDataCollector:
+@app.after_request
+def record_first_request(response):
+    if STARTUP['first_request_seconds'] is None:
+        STARTUP['first_request_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 3)
+        logger.info(f"🚀 First request served {STARTUP['first_request_seconds']}s after import started")
+    return response
+
+class Metrics:
+    # In-process counters and latency histograms, rendered in the Prometheus
+    # text format on /metrics. Each worker exposes its own series.
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    descriptions = {
+        'financegpt_upstream_request_seconds': ('histogram', 'Latency of upstream calls, excluding limiter waits'),
+        'financegpt_upstream_wait_seconds': ('histogram', 'Time spent waiting for an upstream rate limiter token'),
+        'financegpt_upstream_requests_total': ('counter', 'Upstream calls by outcome'),
+        'financegpt_upstream_rate_limited_total': ('counter', 'HTTP 429 / rate limit responses from upstreams'),
+        'financegpt_upstream_retries_total': ('counter', 'Retried upstream calls'),
+        'financegpt_symbol_seconds': ('histogram', 'Latency of one market record, prediction or news lookup'),
+        'financegpt_cache_requests_total': ('counter', 'Cache lookups by cache and result'),
+        'financegpt_refresh_seconds': ('histogram', 'Duration of market refresh cycles'),
+        'financegpt_refresh_total': ('counter', 'Market refresh cycles by outcome'),
+        'financegpt_prescreen_total': ('counter', 'Screened predictions by outcome (cached, baseline, escalated)'),
+    }
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            histogram['counts'][index] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+    
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+    
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ''
+        escaped = []
+        for key, value in labels:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+    
+    def render(self, gauges=()):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: {**value, 'counts': list(value['counts'])} for key, value in self.histograms.items()}
+        
+        descriptions = dict(self.descriptions)
+        series = {}
+        for (name, labels), value in sorted(counters.items()):
+            series.setdefault(name, []).append(f"{name}{self.format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(histograms.items()):
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), histogram['counts']):
+                cumulative += count
+                lines.append(f"{name}_bucket{self.format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{self.format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{self.format_labels(labels)} {histogram['count']}")
+        # Gauges are read from live state at scrape time: (name, labels, value, help).
+        for name, labels, value, description in gauges:
+            descriptions.setdefault(name, ('gauge', description))
+            series.setdefault(name, []).append(f"{name}{self.format_labels(tuple(sorted(labels.items())))} {value}")
+        
+        output = []
+        for name in sorted(series):
+            kind, description = descriptions.get(name, ('untyped', name))
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(series[name])
+        return '\n'.join(output) + '\n'
+
+metrics = Metrics(enabled=os.getenv('METRICS_ENABLED', '1') == '1')
+
+@contextlib.contextmanager
+def symbol_timer(operation, symbol):
+    # The histogram is labelled by operation only, so its series count does
+    # not grow with the universe; per-symbol timings go to the debug log.
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('financegpt_symbol_seconds', elapsed, operation=operation)
+        logger.debug("⏱️ %s for %s took %.3fs", operation, symbol, elapsed)
+
+class TokenBucket:
+    def __init__(self, rate, capacity, min_rate=None):
+        self.rate = float(rate)
+        self.base_rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate else self.base_rate / 10
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def reserve(self, tokens=1):
+        # Takes the tokens now (possibly going into debt) and returns how long
+        # the caller has to wait before its reservation is honoured.
+        with self.lock:
+            self._refill()
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+    
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+    
+    def pause(self, seconds):
+        # Push every waiting caller back by `seconds`, e.g. after a 429.
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+    
+    def refund(self, tokens=1):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+    
+    def throttle(self, retry_after=None):
+        # Halve the rate on every 429 and hold everyone back for Retry-After
+        # (or one slot at the new rate if the provider did not say).
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+        self.pause(retry_after if retry_after else 1 / self.rate)
+    
+    def recover(self):
+        with self.lock:
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+    
+    def snapshot(self):
+        with self.lock:
+            self._refill()
+            return {
+                'rate': round(self.rate, 3),
+                'base_rate': self.base_rate,
+                'tokens': round(self.tokens, 2),
+                'capacity': self.capacity
+            }
+
+class UpstreamUnavailableError(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+    
+    def allow(self):
+        with self.lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = 'half_open'
+                self.trial_in_flight = False
+            if self.state == 'half_open':
+                # Let exactly one trial request through to probe the provider.
+                if self.trial_in_flight:
+                    return False
+                self.trial_in_flight = True
+            return True
+    
+    def release(self):
+        # The allowed request was never sent, so a half-open probe is still free.
+        with self.lock:
+            self.trial_in_flight = False
+    
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_in_flight = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+    
+    def snapshot(self):
+        with self.lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = round(max(0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {'state': self.state, 'failures': self.failures, 'retry_in': retry_in}
+
+class UpstreamGovernor:
+    # provider: (env prefix, requests per second, burst, longest wait before failing fast)
+    limits = {
+        'yfinance': ('YF', 2, 5, 30),
+        'groq': ('GROQ', 1, 30, 10),
+        'newsapi': ('NEWSAPI', 1, 5, 5),
+        'alpha_vantage': ('ALPHA_VANTAGE', 0.1, 2, 5),
+        'yahoo_rss': ('YAHOO_RSS', 2, 5, 5)
+    }
+    
     def __init__(self):
-        self.top_stocks = [
-            'MSFT', 'NVDA', 'AAPL', 'AMZN', 'GOOGL', 'META', 'AVGO', 'TCEHY', 'TSLA', 'TSM',
-            'UNH', 'JPM', 'LLY', 'ORCL', 'ASML', 'BABA', 'NFLX', 'MA', 'XOM', 'PLTR',
-            'COST', 'KO', 'PFE', 'PG', 'JNJ', 'HD', 'CVX', 'WFC', 'SAP', 'ABBV'
-        ]
+        self.upstreams = {}
+        self.lock = threading.Lock()
+    
+    def get(self, provider):
+        with self.lock:
+            upstream = self.upstreams.get(provider)
+            if upstream is None:
+                prefix, rate, burst, max_wait = self.limits.get(provider, (provider.upper(), 1, 5, 10))
+                upstream = {
+                    'bucket': TokenBucket(
+                        rate=float(os.getenv(f'{prefix}_REQUESTS_PER_SECOND', rate)),
+                        capacity=float(os.getenv(f'{prefix}_BURST', burst))
+                    ),
+                    'breaker': CircuitBreaker(
+                        failure_threshold=int(os.getenv(f'{prefix}_FAILURE_THRESHOLD', '5')),
+                        reset_timeout=float(os.getenv(f'{prefix}_RESET_TIMEOUT', '30'))
+                    ),
+                    'max_wait': float(max_wait),
+                    'rate_limited': 0
+                }
+                self.upstreams[provider] = upstream
+            return upstream
+    
+    def reserve(self, provider):
+        upstream = self.get(provider)
+        if not upstream['breaker'].allow():
+            metrics.inc('financegpt_upstream_requests_total', provider=provider, outcome='circuit_open')
+            raise UpstreamUnavailableError(f"{provider} circuit is open")
         
-        self.top_cryptos = [
-            'BTC-USD', 'ETH-USD', 'USDT-USD', 'XRP-USD', 'BNB-USD', 'SOL-USD', 'ADA-USD', 
-            'DOGE-USD', 'DOT-USD', 'MATIC-USD', 'LTC-USD', 'SHIB-USD', 'WLD-USD', 
-            'HNT-USD', 'AVAX-USD', 'LINK-USD'
-        ]
+        wait = upstream['bucket'].reserve()
+        if wait > upstream['max_wait']:
+            upstream['bucket'].refund()
+            upstream['breaker'].release()
+            metrics.inc('financegpt_upstream_requests_total', provider=provider, outcome='throttled')
+            raise UpstreamUnavailableError(f"{provider} is rate limited for another {wait:.0f}s")
+        metrics.observe('financegpt_upstream_wait_seconds', wait, provider=provider)
+        return wait
+    
+    def acquire(self, provider):
+        wait = self.reserve(provider)
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def acquire_async(self, provider):
+        wait = self.reserve(provider)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                # Cancelled before sending: hand back the token and, if this
+                # was the half-open probe, the probe slot.
+                self.get(provider)['bucket'].refund()
+                self.abandon(provider)
+                raise
+    
+    def abandon(self, provider):
+        # The call ended without telling us anything about the provider
+        # (cancelled, interrupted, or a bug on our side), so it is neither a
+        # success nor a failure, but it must not keep the half-open probe.
+        self.get(provider)['breaker'].release()
+    
+    def record_success(self, provider):
+        upstream = self.get(provider)
+        upstream['breaker'].record_success()
+        upstream['bucket'].recover()
+    
+    def record_failure(self, provider, rate_limited=False, retry_after=None):
+        upstream = self.get(provider)
+        upstream['breaker'].record_failure()
+        if rate_limited:
+            upstream['rate_limited'] += 1
+            metrics.inc('financegpt_upstream_rate_limited_total', provider=provider)
+            upstream['bucket'].throttle(retry_after)
+            logger.warning(f"⏳ {provider} rate limited - slowing to {upstream['bucket'].rate:.2f} req/s")
+    
+    def record_call(self, provider, started, outcome):
+        metrics.observe('financegpt_upstream_request_seconds', time.perf_counter() - started, provider=provider)
+        metrics.inc('financegpt_upstream_requests_total', provider=provider, outcome=outcome)
+    
+    def record_response(self, provider, response, started):
+        self.record_call(provider, started, str(response.status_code))
+        if response.status_code == 429:
+            self.record_failure(provider, rate_limited=True, retry_after=parse_retry_after(response.headers.get('Retry-After')))
+        elif response.status_code >= 500:
+            self.record_failure(provider)
+        else:
+            self.record_success(provider)
+    
+    def request(self, provider, send, url, **kwargs):
+        self.acquire(provider)
+        started = time.perf_counter()
+        try:
+            response = send(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.record_call(provider, started, 'error')
+            self.record_failure(provider)
+            raise
+        except BaseException:
+            self.record_call(provider, started, 'abandoned')
+            self.abandon(provider)
+            raise
+        
+        self.record_response(provider, response, started)
+        return response
+    
+    async def request_async(self, provider, send, url, **kwargs):
+        await self.acquire_async(provider)
+        started = time.perf_counter()
+        try:
+            response = await send(url, **kwargs)
+        except Exception:
+            self.record_call(provider, started, 'error')
+            self.record_failure(provider)
+            raise
+        except BaseException:
+            # Cancelled, e.g. a news provider that lost the race.
+            self.record_call(provider, started, 'abandoned')
+            self.abandon(provider)
+            raise
+        
+        self.record_response(provider, response, started)
+        return response
+    
+    def call(self, provider, fn, *args, **kwargs):
+        self.acquire(provider)
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            rate_limited = "429" in str(e) or "Too Many Requests" in str(e)
+            self.record_call(provider, started, '429' if rate_limited else 'error')
+            self.record_failure(provider, rate_limited=rate_limited)
+            raise
+        except BaseException:
+            self.record_call(provider, started, 'abandoned')
+            self.abandon(provider)
+            raise
+        self.record_call(provider, started, 'ok')
+        self.record_success(provider)
+        return result
+    
+    def backoff(self, attempt, base=1.0, cap=8.0):
+        # Full jitter keeps retrying workers from waking up in lockstep.
+        return random.uniform(0, min(cap, base * 2 ** attempt))
+    
+    def snapshot(self):
+        with self.lock:
+            upstreams = dict(self.upstreams)
+        return {
+            provider: {
+                'limiter': upstream['bucket'].snapshot(),
+                'breaker': upstream['breaker'].snapshot(),
+                'rate_limited': upstream['rate_limited']
+            }
+            for provider, upstream in upstreams.items()
+        }
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+upstream_governor = UpstreamGovernor()
+
+DATA_DIR = os.getenv('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+class MemoryCacheBackend:
+    # In-process only: every worker keeps its own copy, as before.
+    name = 'memory'
+    shared = False
+    
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def _live(self, key):
+        item = self.values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self.values[key]
+            return None
+        return item
+    
+    def get(self, key):
+        with self.lock:
+            item = self._live(key)
+            return item[0] if item else None
+    
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.values[key] = (value, time.time() + ttl if ttl else None)
+    
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+    
+    def incr(self, key):
+        with self.lock:
+            item = self._live(key)
+            value = (item[0] if item else 0) + 1
+            self.values[key] = (value, None)
+            return value
+    
+    def add(self, key, value, ttl=None):
+        # Set only if absent; True when this call stored the value.
+        with self.lock:
+            if self._live(key):
+                return False
+            self.values[key] = (value, time.time() + ttl if ttl else None)
+            return True
+    
+    def acquire_lock(self, name, ttl):
+        token = uuid.uuid4().hex
+        return token if self.add(f"lock:{name}", token, ttl) else None
+    
+    def release_lock(self, name, token):
+        with self.lock:
+            item = self._live(f"lock:{name}")
+            if item and item[0] == token:
+                del self.values[f"lock:{name}"]
+
+class SQLiteCacheBackend:
+    # Shared by every worker on one host through a WAL-mode database file.
+    name = 'sqlite'
+    shared = True
+    
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+    
+    def conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+            self.local.conn = conn
+        return conn
+    
+    def _get(self, conn, key):
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0])
+    
+    def get(self, key):
+        return self._get(self.conn(), key)
+    
+    def set(self, key, value, ttl=None):
+        self.conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None)
+        )
+    
+    def delete(self, key):
+        self.conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+    
+    def incr(self, key):
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = (self._get(conn, key) or 0) + 1
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, NULL)", (key, json.dumps(value)))
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def add(self, key, value, ttl=None):
+        # Set only if absent (or expired); True when this call stored the value.
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._get(conn, key) is not None:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl if ttl else None)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def acquire_lock(self, name, ttl):
+        token = uuid.uuid4().hex
+        return token if self.add(f"lock:{name}", token, ttl) else None
+    
+    def release_lock(self, name, token):
+        self.conn().execute("DELETE FROM cache WHERE key = ? AND value = ?", (f"lock:{name}", json.dumps(token)))
+
+class RedisCacheBackend:
+    # Speaks plain RESP over a socket, so any Redis-compatible server (or a
+    # local stand-in) works without the redis package.
+    name = 'redis'
+    shared = True
+    # Deletes the lock only while it still holds our token.
+    release_script = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+    
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, prefix='financegpt:', timeout=5):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self.local = threading.local()
+    
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.local.sock = sock
+        self.local.reader = sock.makefile('rb')
+        if self.password:
+            self.send_command('AUTH', self.password)
+        if self.db:
+            self.send_command('SELECT', self.db)
+    
+    def write_command(self, *args):
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self.local.sock.sendall(b''.join(payload))
+    
+    def send_command(self, *args):
+        self.write_command(*args)
+        return self.read_reply()
+    
+    def disconnect(self):
+        sock, self.local.sock = getattr(self.local, 'sock', None), None
+        if sock is not None:
+            with contextlib.suppress(OSError):
+                sock.close()
+    
+    def read_reply(self):
+        line = self.local.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RuntimeError(f"Redis error: {rest.decode()}")
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+    
+    def command(self, *args, idempotent=True):
+        if getattr(self.local, 'sock', None) is None:
+            self.connect()
+        try:
+            self.write_command(*args)
+        except OSError:
+            # The command never fully left, so resending is always safe.
+            self.disconnect()
+            self.connect()
+            self.write_command(*args)
+        try:
+            return self.read_reply()
+        except (OSError, ConnectionError):
+            # The server may already have run it: only repeat commands
+            # where a second run changes nothing (not INCR or SET NX).
+            self.disconnect()
+            if not idempotent:
+                raise
+            self.connect()
+            return self.send_command(*args)
+    
+    def get(self, key):
+        value = self.command('GET', self.prefix + key)
+        return json.loads(value) if value is not None else None
+    
+    def set(self, key, value, ttl=None):
+        args = ['SET', self.prefix + key, json.dumps(value)]
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        self.command(*args)
+    
+    def delete(self, key):
+        self.command('DEL', self.prefix + key)
+    
+    def incr(self, key):
+        return self.command('INCR', self.prefix + key, idempotent=False)
+    
+    def add(self, key, value, ttl=None):
+        # Set only if absent; True when this call stored the value.
+        args = ['SET', self.prefix + key, json.dumps(value), 'NX']
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        return self.command(*args, idempotent=False) == 'OK'
+    
+    def acquire_lock(self, name, ttl):
+        token = uuid.uuid4().hex
+        return token if self.add(f"lock:{name}", token, ttl) else None
+    
+    def release_lock(self, name, token):
+        self.command('EVAL', self.release_script, 1, f"{self.prefix}lock:{name}", json.dumps(token))
+
+def create_cache_backend(url):
+    # memory | sqlite:///path/to/cache.db | redis://[:password@]host:port/db
+    if not url or url == 'memory':
+        return MemoryCacheBackend()
+    
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        return SQLiteCacheBackend(parsed.path or os.path.join(DATA_DIR, 'cache.db'))
+    if parsed.scheme == 'redis':
+        return RedisCacheBackend(
+            host=parsed.hostname or '127.0.0.1',
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip('/') or 0),
+            password=parsed.password
+        )
+    raise ValueError(f"Unknown CACHE_BACKEND: {url}")
+
+cache_backend = create_cache_backend(os.getenv('CACHE_BACKEND', 'memory'))
+
+def write_json_atomic(path, data):
+    # Every writer gets its own temp file, so workers sharing DATA_DIR never
+    # rename each other's half-written output into place.
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+class PriceStore:
+    dtype = np.dtype([
+        ('ts', 'i8'), ('open', 'f8'), ('high', 'f8'),
+        ('low', 'f8'), ('close', 'f8'), ('volume', 'f8')
+    ])
+    columns = (('open', 'Open'), ('high', 'High'), ('low', 'Low'), ('close', 'Close'), ('volume', 'Volume'))
+    period_days = {'d': 1, 'wk': 7, 'mo': 31, 'y': 366}
+    
+    def __init__(self, directory, initial_period="1mo", min_update_interval=60, governor=None):
+        self.directory = directory
+        self.governor = governor or upstream_governor
+        self.initial_period = initial_period
+        self.min_update_interval = min_update_interval
+        self.arrays = {}
+        self.checked = {}
+        self.versions = {}
+        self.lock = threading.RLock()
+    
+    def path(self, symbol):
+        return os.path.join(self.directory, f"{symbol.replace('/', '_')}.npy")
+    
+    def load(self, symbol):
+        with self.lock:
+            if symbol in self.arrays:
+                return self.arrays[symbol]
+            
+            bars = np.empty(0, dtype=self.dtype)
+            path = self.path(symbol)
+            if os.path.exists(path):
+                try:
+                    bars = np.load(path, mmap_mode='r')
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Ignoring unreadable price file for {symbol}: {e}")
+            
+            self.arrays[symbol] = bars
+            return bars
+    
+    def initial_window(self):
+        # Seconds covered by initial_period, or None for open-ended periods
+        # such as 'max' and 'ytd'.
+        count = self.initial_period.rstrip('dwkmoy')
+        unit = self.initial_period[len(count):]
+        if count.isdigit() and unit in self.period_days:
+            return int(count) * self.period_days[unit] * 86400
+        return None
+    
+    def last_timestamp(self, symbol):
+        bars = self.load(symbol)
+        return int(bars['ts'][-1]) if len(bars) else None
+    
+    def write(self, symbol, new_bars):
+        if len(new_bars) == 0:
+            return
+        
+        with self.lock:
+            existing = self.load(symbol)
+            # Re-fetched bars replace stored ones from the same timestamp on,
+            # so today's still-forming bar is overwritten rather than duplicated.
+            kept = existing[existing['ts'] < new_bars['ts'][0]]
+            bars = np.concatenate([np.asarray(kept), new_bars])
+            
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(symbol)
+            # A private temp file per write: other workers share the directory.
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                try:
+                    np.save(f, bars)
+                except BaseException:
+                    f.close()
+                    os.unlink(tmp_path)
+                    raise
+            os.replace(tmp_path, path)
+            self.arrays[symbol] = np.load(path, mmap_mode='r')
+            self.versions[symbol] = self.versions.get(symbol, 0) + 1
+    
+    def frame_to_bars(self, frame):
+        frame = frame.dropna(subset=['Close'])
+        bars = np.empty(len(frame), dtype=self.dtype)
+        bars['ts'] = [int(ts.timestamp()) for ts in frame.index]
+        for field, column in self.columns:
+            bars[field] = frame[column].to_numpy(dtype=float) if column in frame else np.nan
+        return bars
+    
+    def update(self, symbols, max_age=None):
+        max_age = self.min_update_interval if max_age is None else max_age
+        now = time.monotonic()
+        
+        with self.lock:
+            due = [s for s in symbols if now - self.checked.get(s, float('-inf')) >= max_age]
+            # Claim them up front so concurrent callers read stored bars
+            # instead of downloading the same symbols again.
+            for symbol in due:
+                self.checked[symbol] = now
+        if not due:
+            return
+        
+        # At most two bulk downloads: an initial window for symbols we have
+        # never seen, and everything since the oldest last bar for the rest.
+        # A symbol whose last bar predates the initial window (a halted or
+        # long-unchecked ticker) goes with the first group, so it cannot pin
+        # everyone else's start date.
+        window = self.initial_window()
+        cutoff = time.time() - window if window else None
+        last = {s: self.last_timestamp(s) for s in due}
+        missing = [s for s in due if last[s] is None or (cutoff is not None and last[s] < cutoff)]
+        known = [s for s in due if s not in missing]
+        
+        requests_to_make = []
+        if missing:
+            requests_to_make.append((missing, {'period': self.initial_period}))
+        if known:
+            oldest = min(last[s] for s in known)
+            start = datetime.utcfromtimestamp(oldest).strftime('%Y-%m-%d')
+            requests_to_make.append((known, {'start': start}))
+        
+        for group, kwargs in requests_to_make:
+            try:
+                hist = self.governor.call(
+                    'yfinance', yf.download, group, group_by='ticker',
+                    auto_adjust=True, threads=True, progress=False, **kwargs
+                )
+            except Exception:
+                with self.lock:
+                    for symbol in group:
+                        self.checked.pop(symbol, None)
+                raise
+            
+            if hist is None or len(hist) == 0:
+                continue
+            
+            multi_index = getattr(hist.columns, 'nlevels', 1) > 1
+            if not multi_index and len(group) > 1:
+                continue
+            
+            for symbol in group:
+                try:
+                    frame = hist[symbol] if multi_index else hist
+                    self.write(symbol, self.frame_to_bars(frame))
+                except KeyError:
+                    continue
+    
+    def window(self, symbol, days=None, bars=None):
+        stored = self.load(symbol)
+        if days is not None:
+            cutoff = int(time.time()) - days * 86400
+            stored = stored[stored['ts'] >= cutoff]
+        if bars is not None:
+            stored = stored[-bars:]
+        return stored
+    
+    def closes(self, symbol, bars=None, days=None):
+        return np.asarray(self.window(symbol, days=days, bars=bars)['close'], dtype=float)
+
+price_store = PriceStore(os.getenv('PRICE_STORE_DIR', os.path.join(DATA_DIR, 'prices')))
+
+def trend_bucket(change_7d):
+    return "bullish" if change_7d > 2 else "bearish" if change_7d < -2 else "neutral"
+
+def volatility_bucket(volatility):
+    return "high" if volatility > 45 else "low" if volatility < 20 else "medium"
+
+class MarketAnalytics:
+    def __init__(self, store=None, window_days=31):
+        self.price_store = store or price_store
+        self.window_days = window_days
+        self.results = {}
+        self.lock = threading.Lock()
+    
+    def close_matrix(self, symbols):
+        # One row per symbol, right-aligned on each symbol's own latest bar so
+        # column -k is "k bars ago" for stocks and crypto alike.
+        windows = [self.price_store.closes(symbol, days=self.window_days) for symbol in symbols]
+        width = max((len(window) for window in windows), default=0)
+        matrix = np.full((len(symbols), width), np.nan)
+        for row, window in enumerate(windows):
+            if len(window):
+                matrix[row, width - len(window):] = window
+        return matrix
+    
+    def compute(self, symbols):
+        symbols = list(symbols)
+        versions = [self.price_store.versions.get(symbol, 0) for symbol in symbols]
+        matrix = self.close_matrix(symbols)
+        rows, width = matrix.shape
+        if width == 0:
+            return {}
+        
+        counts = np.sum(~np.isnan(matrix), axis=1)
+        current = matrix[:, -1]
+        
+        def bars_ago(k):
+            if width < k:
+                return current
+            return np.where(np.isnan(matrix[:, -k]), current, matrix[:, -k])
+        
+        first = matrix[np.arange(rows), np.clip(width - counts, 0, width - 1)]
+        periods = np.array([365 if symbol.endswith('-USD') else 252 for symbol in symbols])
+        
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            change_1d = (current / bars_ago(2) - 1) * 100
+            change_7d = (current / bars_ago(7) - 1) * 100
+            change_30d = (current / first - 1) * 100
+            
+            log_returns = np.diff(np.log(matrix), axis=1)
+            volatility = np.nanstd(log_returns, axis=1, ddof=1) * np.sqrt(periods) * 100
+            
+            running_max = np.fmax.accumulate(matrix, axis=1)
+            drawdown = np.nanmin(matrix / running_max - 1, axis=1) * 100
+            
+            sma_5 = np.nanmean(matrix[:, -5:], axis=1)
+            sma_20 = np.nanmean(matrix[:, -20:], axis=1)
+        
+        stats = np.nan_to_num(np.vstack([change_1d, change_7d, change_30d, volatility, drawdown]))
+        change_1d, change_7d, change_30d, volatility, drawdown = stats
+        
+        results = {}
+        for row, symbol in enumerate(symbols):
+            if counts[row] == 0:
+                continue
+            results[symbol] = {
+                'current_price': float(current[row]),
+                'change_1d': float(change_1d[row]),
+                'change_7d': float(change_7d[row]),
+                'change_30d': float(change_30d[row]),
+                'volatility': float(volatility[row]),
+                'max_drawdown': float(drawdown[row]),
+                'sma_5': float(sma_5[row]),
+                'sma_20': float(sma_20[row]),
+                'bars': int(counts[row]),
+                'version': versions[row]
+            }
+        
+        with self.lock:
+            self.results.update(results)
+        return results
+    
+    def get(self, symbol):
+        result = self.results.get(symbol)
+        if result is None or result['version'] != self.price_store.versions.get(symbol, 0):
+            result = self.compute([symbol]).get(symbol)
+        return result
+
+market_analytics = MarketAnalytics()
+
+class PredictionCache:
+    def __init__(self, path, max_size=500, max_age=4 * 3600, drift_threshold=2.0, change_bucket=5.0, backend=None,
+                 save_interval=60):
+        self.path = path
+        # With a shared backend, entries live there (with a TTL) and the local
+        # OrderedDict is just a bounded hot copy; otherwise they go to `path`.
+        self.backend = backend
+        self.max_size = max_size
+        self.max_age = max_age
+        self.drift_threshold = drift_threshold
+        self.change_bucket = change_bucket
+        self.save_interval = save_interval
+        self.entries = None
+        self.dirty = False
+        self.last_save = time.monotonic()
+        self.lock = threading.RLock()
+    
+    def fingerprint(self, context):
+        parts = (
+            context['symbol'], context['trend'], context['volatility_bucket'],
+            round(context['change_7d'] / self.change_bucket),
+            round(context['change_30d'] / self.change_bucket)
+        )
+        return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()[:16]
+    
+    def load(self):
+        with self.lock:
+            if self.entries is not None:
+                return
+            self.entries = OrderedDict()
+            if self.backend is None and os.path.exists(self.path):
+                try:
+                    with open(self.path) as f:
+                        self.entries.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Ignoring unreadable prediction cache: {e}")
+    
+    def save(self, force=False):
+        with self.lock:
+            if not self.dirty or (not force and time.monotonic() - self.last_save < self.save_interval):
+                return
+            # A failed write keeps the entries dirty for the next save; it
+            # must not cost the caller a prediction that was already paid for.
+            self.last_save = time.monotonic()
+            try:
+                write_json_atomic(self.path, self.entries)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"⚠️ Could not save prediction cache: {e}")
+                return
+            self.dirty = False
+    
+    def get(self, context):
+        self.load()
+        symbol = context['symbol']
+        if symbol not in self.entries and self.backend is not None:
+            shared_entry = self.backend.get(f"prediction:{symbol}")
+            if shared_entry:
+                with self.lock:
+                    self.entries[symbol] = shared_entry
+        
+        with self.lock:
+            entry = self.entries.get(symbol)
+            if entry is None:
+                metrics.inc('financegpt_cache_requests_total', cache='prediction', result='miss')
+                return None
+            
+            age = time.time() - entry['cached_at']
+            drift = abs(context['current_price'] - entry['price']) / entry['price'] * 100 if entry['price'] else 100
+            if entry['fingerprint'] != self.fingerprint(context) or age >= self.max_age or drift >= self.drift_threshold:
+                # The inputs moved enough that the old answer no longer applies.
+                del self.entries[symbol]
+                if self.backend is not None:
+                    self.backend.delete(f"prediction:{symbol}")
+                else:
+                    self.dirty = True
+                metrics.inc('financegpt_cache_requests_total', cache='prediction', result='expired')
+                return None
+            
+            self.entries.move_to_end(symbol)
+            metrics.inc('financegpt_cache_requests_total', cache='prediction', result='hit')
+            return entry['prediction']
+    
+    def put(self, context, prediction):
+        self.load()
+        entry = {
+            'fingerprint': self.fingerprint(context),
+            'price': context['current_price'],
+            'cached_at': time.time(),
+            'prediction': prediction
+        }
+        with self.lock:
+            self.entries[context['symbol']] = entry
+            self.entries.move_to_end(context['symbol'])
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.dirty = True
+        if self.backend is None:
+            # Flushed at most once per save_interval, and on exit.
+            self.save()
+        else:
+            self.backend.set(f"prediction:{context['symbol']}", entry, ttl=self.max_age)
+    
+    def __len__(self):
+        self.load()
+        return len(self.entries)
+
+CONFIG_DIR = os.getenv('CONFIG_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config'))
+
+class SymbolUniverse:
+    # Symbols per asset class. The config maps each asset class to an inline
+    # list or to a file next to it: .txt with one symbol per line, or .csv
+    # with a 'symbol' column.
+    def __init__(self, path, shard_size=50):
+        self.path = path
+        self.shard_size = max(1, shard_size)
+        self.assets = None
+        self.shard_lists = {}
+        self.lock = threading.Lock()
+    
+    def load(self):
+        with self.lock:
+            if self.assets is not None:
+                return
+            with open(self.path) as f:
+                config = json.load(f)
+            
+            assets = {}
+            for asset_type, source in config.items():
+                if isinstance(source, str):
+                    source = self.read_symbols(os.path.join(os.path.dirname(self.path), source))
+                assets[asset_type] = list(dict.fromkeys(symbol.strip().upper() for symbol in source if symbol.strip()))
+            self.assets = assets
+            self.shard_lists = {
+                asset_type: [symbols[i:i + self.shard_size] for i in range(0, len(symbols), self.shard_size)]
+                for asset_type, symbols in assets.items()
+            }
+    
+    def read_symbols(self, path):
+        with open(path, newline='') as f:
+            if path.endswith('.csv'):
+                return [row.get('symbol') or row.get('Symbol') or '' for row in csv.DictReader(f)]
+            return [line.split('#')[0] for line in f]
+    
+    def asset_types(self):
+        self.load()
+        return list(self.assets)
+    
+    def symbols(self, asset_type):
+        self.load()
+        return self.assets.get(asset_type, [])
+    
+    def shards(self, asset_type):
+        self.load()
+        return self.shard_lists.get(asset_type, [])
+    
+    def shard(self, asset_type, index):
+        return self.shards(asset_type)[index]
+
+symbol_universe = SymbolUniverse(
+    os.getenv('UNIVERSE_PATH', os.path.join(CONFIG_DIR, 'universe.json')),
+    shard_size=int(os.getenv('UNIVERSE_SHARD_SIZE', '50'))
+)
+
+class SymbolRegistry:
+    def __init__(self, path, ttls=None, metadata_path=None):
+        self.path = path
+        # Known domains and logos for symbols yfinance does not describe well;
+        # everything else learns its domain from the ticker's website.
+        self.metadata_path = metadata_path or os.getenv('SYMBOL_METADATA_PATH', os.path.join(CONFIG_DIR, 'symbols.json'))
+        self.metadata = None
+        self.ttls = ttls or {
+            'name': int(os.getenv('SYMBOL_NAME_TTL', str(3 * 86400))),
+            'market_cap': int(os.getenv('SYMBOL_MARKET_CAP_TTL', '3600'))
+        }
+        self.entries = None
+        self.dirty = False
+        self.lock = threading.RLock()
+    
+    def load(self):
+        with self.lock:
+            if self.entries is not None:
+                return
+            self.metadata = {'domains': {}, 'logos': {}}
+            if os.path.exists(self.metadata_path):
+                try:
+                    with open(self.metadata_path) as f:
+                        self.metadata.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Ignoring unreadable symbol metadata: {e}")
+            
+            self.entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path) as f:
+                        self.entries = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Ignoring unreadable symbol registry: {e}")
+    
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                write_json_atomic(self.path, self.entries)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"⚠️ Could not save symbol registry: {e}")
+                return
+            self.dirty = False
+    
+    def logo_for(self, symbol, domain):
+        if symbol in self.metadata['logos']:
+            return self.metadata['logos'][symbol]
+        if symbol.endswith('-USD'):
+            return None
+        return f"https://logo.clearbit.com/{domain}" if domain else None
+    
+    def seed(self, symbol):
+        domain = self.metadata['domains'].get(symbol)
+        return {
+            'name': symbol,
+            'market_cap': 0,
+            'domain': domain,
+            'logo_url': self.logo_for(symbol, domain),
+            'updated': {}
+        }
+    
+    def get(self, symbol):
+        self.load()
+        entry = self.entries.get(symbol)
+        if entry is None:
+            with self.lock:
+                entry = self.entries.setdefault(symbol, self.seed(symbol))
+        return entry
+    
+    def stale_fields(self, symbol):
+        updated = self.get(symbol)['updated']
+        now = time.time()
+        return [field for field, ttl in self.ttls.items() if now - updated.get(field, 0) >= ttl]
+    
+    def update(self, symbol, **fields):
+        entry = self.get(symbol)
+        now = time.time()
+        with self.lock:
+            for field, value in fields.items():
+                entry[field] = value
+                entry['updated'][field] = now
+            self.dirty = True
+
+symbol_registry = SymbolRegistry(os.getenv('SYMBOL_REGISTRY_PATH', os.path.join(DATA_DIR, 'symbols.json')))
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+    
+    def in_flight(self, key):
+        with self.lock:
+            return key in self.calls
+    
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self.calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+        
+        try:
+            call['result'] = fn(*args, **kwargs)
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self.calls)
+            }
+
+class TickRing:
+    # The most recent ticks for one symbol in a preallocated ring:
+    # capacity * 24 bytes, fixed for the life of the process.
+    dtype = np.dtype([('ts', 'f8'), ('price', 'f8'), ('volume', 'f8')])
+
+    def __init__(self, capacity):
+        self.ticks = np.zeros(capacity, dtype=self.dtype)
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+
+    def append(self, ts, price, volume):
+        self.ticks[self.head] = (ts, price, volume)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        return self.ticks[self.head - 1] if self.count else None
+
+    def ordered(self):
+        if self.count < self.capacity:
+            return self.ticks[:self.count].copy()
+        return np.concatenate((self.ticks[self.head:], self.ticks[:self.head]))
+
+    def ohlc(self, interval, since=None):
+        ticks = self.ordered()
+        if since is not None:
+            ticks = ticks[ticks['ts'] >= since]
+        if not len(ticks):
+            return np.empty(0, dtype=PriceStore.dtype)
+
+        # Ticks are time-ordered, so each bar is a contiguous run.
+        buckets = (ticks['ts'] // interval).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(ticks)] - 1
+        prices = ticks['price']
+
+        bars = np.empty(len(starts), dtype=PriceStore.dtype)
+        bars['ts'] = buckets[starts] * interval
+        bars['open'] = prices[starts]
+        bars['high'] = np.maximum.reduceat(prices, starts)
+        bars['low'] = np.minimum.reduceat(prices, starts)
+        bars['close'] = prices[ends]
+        bars['volume'] = np.add.reduceat(ticks['volume'], starts)
+        return bars
+
+class TickSubscription:
+    # Bounded mailbox for one client: when it falls behind, the oldest ticks
+    # are dropped rather than letting the backlog grow.
+    def __init__(self, hub, symbols=None, max_pending=1000, loop=None):
+        self.hub = hub
+        self.symbols = set(symbols) if symbols else None
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.loop = loop
+        self.ready = asyncio.Event() if loop else threading.Event()
+
+    def wants(self, symbol):
+        return self.symbols is None or symbol in self.symbols
+
+    def deliver(self, event):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(event)
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        else:
+            self.ready.set()
+
+    def drain(self):
+        self.ready.clear()
+        events = []
+        while self.pending:
+            events.append(self.pending.popleft())
+        return events
+
+    def get(self, timeout=None):
+        if not self.pending:
+            self.ready.wait(timeout)
+        return self.drain()
+
+    async def get_async(self, timeout=None):
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.drain()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+class LiveQuoteHub:
+    # Latest ticks per symbol plus an in-process publish/subscribe channel.
+    # Memory is bounded by max_symbols * capacity * TickRing.dtype.itemsize.
+    def __init__(self, capacity=1024, max_symbols=10000, max_pending=1000):
+        self.capacity = capacity
+        self.max_symbols = max_symbols
+        self.max_pending = max_pending
+        self.rings = {}
+        # Replaced, never mutated, so publish() can iterate without a lock.
+        self.subscribers = ()
+        self.lock = threading.Lock()
+        self.published = 0
+        self.rejected = 0
+
+    def publish(self, symbol, price, volume=0.0, ts=None):
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            ring = self.rings.get(symbol)
+            if ring is None:
+                if len(self.rings) >= self.max_symbols:
+                    self.rejected += 1
+                    return False
+                ring = self.rings[symbol] = TickRing(self.capacity)
+            last = ring.latest()
+            if last is not None and ts < last['ts']:
+                ts = float(last['ts'])
+            ring.append(ts, price, volume)
+            self.published += 1
+            subscribers = self.subscribers
+
+        if subscribers:
+            event = {'type': 'tick', 'symbol': symbol, 'price': float(price), 'volume': float(volume), 'ts': ts}
+            for subscription in subscribers:
+                if subscription.wants(symbol):
+                    subscription.deliver(event)
+        return True
+
+    def latest(self, symbol):
+        with self.lock:
+            ring = self.rings.get(symbol)
+            tick = ring.latest() if ring else None
+            if tick is None:
+                return None
+            return {'symbol': symbol, 'price': float(tick['price']), 'volume': float(tick['volume']), 'ts': float(tick['ts'])}
+
+    def latest_many(self, symbols):
+        # One pass under the lock: {symbol: (price, ts)} for symbols with ticks.
+        quotes = {}
+        with self.lock:
+            if not self.rings:
+                return quotes
+            for symbol in symbols:
+                ring = self.rings.get(symbol)
+                if ring is not None and ring.count:
+                    tick = ring.ticks[ring.head - 1]
+                    quotes[symbol] = (float(tick['price']), float(tick['ts']))
+        return quotes
+    
+    def quotes(self, symbols):
+        quotes = {}
+        for symbol in symbols:
+            quote = self.latest(symbol)
+            if quote:
+                quotes[symbol] = quote
+        return quotes
+
+    def ohlc(self, symbol, interval=60, window=None):
+        with self.lock:
+            ring = self.rings.get(symbol)
+            if ring is None:
+                return None
+            since = time.time() - window if window else None
+            return ring.ohlc(interval, since)
+
+    def subscribe(self, symbols=None, loop=None):
+        subscription = TickSubscription(self, symbols, self.max_pending, loop)
+        with self.lock:
+            self.subscribers = self.subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not subscription)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'symbols': len(self.rings),
+                'capacity': self.capacity,
+                'bytes_per_symbol': self.capacity * TickRing.dtype.itemsize,
+                'memory_bytes': len(self.rings) * self.capacity * TickRing.dtype.itemsize,
+                'max_memory_bytes': self.max_symbols * self.capacity * TickRing.dtype.itemsize,
+                'published': self.published,
+                'rejected': self.rejected,
+                'subscribers': len(self.subscribers),
+                'dropped': sum(s.dropped for s in self.subscribers)
+            }
+
+live_quotes = LiveQuoteHub(
+    capacity=int(os.getenv('TICK_BUFFER_SIZE', '1024')),
+    max_symbols=int(os.getenv('TICK_MAX_SYMBOLS', '10000')),
+    max_pending=int(os.getenv('TICK_SUBSCRIBER_QUEUE', '1000'))
+)
+
+class SimulatedFeed:
+    # Random-walk ticks around the last refreshed prices, for exercising the
+    # live path without a market data vendor. LIVE_FEED=simulated starts it.
+    def __init__(self, hub, collector, ticks_per_second=50, volatility=0.0005, seed=None):
+        self.hub = hub
+        self.collector = collector
+        self.ticks_per_second = ticks_per_second
+        self.volatility = volatility
+        self.random = np.random.default_rng(seed)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='simulated-feed', daemon=True)
+        self.thread.start()
+        logger.info(f"📡 Simulated feed started ({self.ticks_per_second} ticks/s)")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def seed_prices(self):
+        prices = {}
+        for asset_type in self.collector.refresh_intervals:
+            data, _ = self.collector.get_cache_entry(asset_type)
+            for symbol, record in (data or {}).items():
+                quote = self.hub.latest(symbol)
+                prices[symbol] = quote['price'] if quote else record['price']
+        return prices
+
+    def run(self):
+        step = 0.1
+        prices, seeded_at = {}, 0.0
+        while not self.stop_event.wait(step):
+            if time.monotonic() - seeded_at > 60 or not prices:
+                prices = self.seed_prices()
+                seeded_at = time.monotonic()
+                if not prices:
+                    continue
+
+            symbols = list(prices)
+            count = min(len(symbols), max(1, int(self.ticks_per_second * step)))
+            chosen = self.random.choice(len(symbols), size=count, replace=False)
+            moves = np.exp(self.random.normal(0, self.volatility, size=count))
+            volumes = self.random.integers(1, 500, size=count)
+            for i, move, volume in zip(chosen, moves, volumes):
+                symbol = symbols[i]
+                prices[symbol] *= float(move)
+                self.hub.publish(symbol, prices[symbol], float(volume))
+
+class MarketIndex:
+    # Column arrays over one snapshot with a precomputed ordering per sort key,
+    # so a query is a mask, a take and a slice instead of a sort per request.
+    sort_fields = {
+        'market_cap': 'market_cap',
+        'change': 'change_pct',
+        'change_7d': 'change_7d',
+        'change_30d': 'change_30d',
+        'volatility': 'volatility',
+        'price': 'price'
+    }
+    
+    def __init__(self, rows, version=None):
+        # rows: (asset_type, symbol, record) in universe order
+        self.version = version
+        self.rows = rows
+        self.asset_types = np.array([asset_type for asset_type, _, _ in rows], dtype=object)
+        self.search_text = np.array([f"{symbol} {record.get('name') or ''}".lower() for _, symbol, record in rows], dtype=object)
+        
+        self.columns = {
+            key: np.array([record.get(field) if record.get(field) is not None else np.nan for _, _, record in rows], dtype=float)
+            for key, field in self.sort_fields.items()
+        }
+        self.columns['movers'] = np.abs(self.columns['change'])
+        
+        # NaNs sort last in both directions.
+        self.orders = {}
+        for key, column in self.columns.items():
+            missing = np.isnan(column)
+            self.orders[key, 'desc'] = np.argsort(np.where(missing, np.inf, -column), kind='stable')
+            self.orders[key, 'asc'] = np.argsort(np.where(missing, np.inf, column), kind='stable')
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def query(self, sort='market_cap', order='desc', asset_type=None, min_market_cap=None, max_market_cap=None,
+              direction=None, search=None, offset=0, limit=50):
+        mask = np.ones(len(self.rows), dtype=bool)
+        if asset_type:
+            mask &= self.asset_types == asset_type
+        market_cap = self.columns['market_cap']
+        if min_market_cap is not None:
+            mask &= market_cap >= min_market_cap
+        if max_market_cap is not None:
+            mask &= market_cap <= max_market_cap
+        if direction == 'gainers':
+            mask &= self.columns['change'] > 0
+        elif direction == 'losers':
+            mask &= self.columns['change'] < 0
+        if search:
+            mask &= np.fromiter((search.lower() in text for text in self.search_text), dtype=bool, count=len(self.rows))
+        
+        ordering = self.orders[sort, order]
+        selected = ordering[mask[ordering]]
+        page = selected[offset:offset + limit]
+        items = []
+        for i in page:
+            row_asset_type, symbol, record = self.rows[i]
+            items.append({'symbol': symbol, 'asset_type': row_asset_type, **record})
+        return len(selected), items
+
+class BackgroundRefresher:
+    def __init__(self, collector, tick=5):
+        self.collector = collector
+        self.tick = tick
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        # Asset classes a request is waiting on, served ahead of the rest.
+        self.urgent = []
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='market-refresher', daemon=True)
+        self.thread.start()
+        logger.info(f"⏱️ Background refresh started ({self.collector.refresh_intervals})")
+    
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+    
+    def wake(self, asset_type):
+        # Start a pass now instead of at the next tick, with `asset_type` first.
+        with self.lock:
+            if asset_type not in self.urgent:
+                self.urgent.append(asset_type)
+        self.wake_event.set()
+    
+    def next_asset_type(self, done):
+        with self.lock:
+            for asset_type in self.urgent:
+                if asset_type not in done:
+                    return asset_type
+        for asset_type in self.collector.refresh_intervals:
+            if asset_type not in done:
+                return asset_type
+        return None
+    
+    def preempted(self, asset_type):
+        # An urgent asset class interrupts a non-urgent one between shards.
+        with self.lock:
+            return bool(self.urgent) and asset_type not in self.urgent
+    
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            done = set()
+            while (asset_type := self.next_asset_type(done)) is not None:
+                for shard in self.collector.shards_to_refresh(asset_type, self.tick):
+                    try:
+                        self.collector.refresh_shard(asset_type, shard)
+                    except Exception as e:
+                        logger.error(f"❌ Background refresh of {asset_type} shard {shard} failed: {e}")
+                    if self.preempted(asset_type):
+                        break
+                else:
+                    done.add(asset_type)
+                    with self.lock:
+                        if asset_type in self.urgent:
+                            self.urgent.remove(asset_type)
+            self.wake_event.wait(self.tick)
+
+class MarketDataCollector:
+    # Crypto trades around the clock and moves faster.
+    default_refresh_intervals = {'stocks': 600, 'crypto': 120}
+    # Record fields that rarely change; delta responses leave them out unless they did.
+    meta_fields = ('name', 'logo_url', 'market_cap')
+    
+    def __init__(self, store=None, registry=None, analytics=None, backend=None, universe=None, live=None):
+        self.universe = universe or symbol_universe
+        self.price_store = store or price_store
+        self.registry = registry or symbol_registry
+        self.analytics = analytics or market_analytics
+        self.max_workers = int(os.getenv('YF_MAX_WORKERS', '8'))
+        self.governor = upstream_governor
+        # Refreshed prices are published as ticks, so the live buffers always
+        # hold at least the last refresh even without a streaming feed.
+        self.live = live or live_quotes
         
         self.cache_duration = 900
-        self.stocks_cache = None
-        self.crypto_cache = None
-        self.stocks_cache_time = None
-        self.crypto_cache_time = None
+        # Snapshots live in the cache backend, one blob per shard, so every
+        # worker serves the same version; `snapshots` memoizes the decoded
+        # copy per shard version and `assembled` the merged view per asset.
+        self.cache_backend = backend or cache_backend
+        self.snapshots = {}
+        self.assembled = {}
+        self.indexes = {}
+        self.epoch = None
+        self.refresh_lock_ttl = 300
+        self.cold_wait = 60
         
+        # Intervals stay below cache_duration so shards are replaced before
+        # they expire.
+        self.refresh_intervals = {
+            asset_type: int(os.getenv(
+                f'{asset_type.upper()}_REFRESH_INTERVAL', str(self.default_refresh_intervals.get(asset_type, 600))
+            ))
+            for asset_type in self.universe.asset_types()
+        }
+        self.max_shards_per_tick = int(os.getenv('MARKET_SHARDS_PER_TICK', '0'))
+        self.refresher = BackgroundRefresher(self)
+        self.single_flight = SingleFlight()
+        self.cache_lock = threading.RLock()
+        # Stream requests waiting on a refresh, per asset class.
+        self.listeners = {}
+    
     def is_cache_valid(self, cache_time):
         if cache_time is None:
             return False
         return (datetime.now() - cache_time).total_seconds() < self.cache_duration
     
     def get_cached_data(self, asset_type):
-        if asset_type == 'stocks':
-            if self.is_cache_valid(self.stocks_cache_time) and self.stocks_cache:
-                print(f"✓ Using cached stocks data (age: {(datetime.now() - self.stocks_cache_time).total_seconds():.0f}s)")
-                return self.stocks_cache
-        elif asset_type == 'crypto':
-            if self.is_cache_valid(self.crypto_cache_time) and self.crypto_cache:
-                print(f"✓ Using cached crypto data (age: {(datetime.now() - self.crypto_cache_time).total_seconds():.0f}s)")
-                return self.crypto_cache
+        data, cache_time = self.get_cache_entry(asset_type)
+        if self.is_cache_valid(cache_time) and data:
+            logger.debug("✓ Using cached %s data (age: %.0fs)", asset_type, (datetime.now() - cache_time).total_seconds())
+            return data
         return None
     
-    def cache_data(self, asset_type, data):
+    def store_snapshot(self, asset_type, shard, data, cache_time):
+        with self.cache_lock:
+            previous = self.get_shard_snapshot(asset_type, shard) or {}
+            old_data = previous.get('data') or {}
+            changes = dict(previous.get('changes') or {})
+            removed = dict(previous.get('removed') or {})
+            
+            # One counter per asset class orders every change across shards
+            # (and workers); each symbol remembers when its quote and its
+            # rarely-changing metadata last moved, for delta responses.
+            asset_version = self.cache_backend.incr(f"market:{asset_type}:version")
+            for symbol, record in data.items():
+                old = old_data.get(symbol)
+                quote_version, meta_version = changes.get(symbol, (asset_version, asset_version))
+                if old is None:
+                    quote_version = meta_version = asset_version
+                else:
+                    if any(record.get(field) != old.get(field) for field in set(record) | set(old) if field not in self.meta_fields):
+                        quote_version = asset_version
+                    if any(record.get(field) != old.get(field) for field in self.meta_fields):
+                        meta_version = asset_version
+                changes[symbol] = [quote_version, meta_version]
+                removed.pop(symbol, None)
+            for symbol in old_data.keys() - data.keys():
+                changes.pop(symbol, None)
+                removed[symbol] = asset_version
+            
+            version = self.cache_backend.incr(f"market:{asset_type}:{shard}:version")
+            snapshot = {
+                'version': version,
+                'asset_version': asset_version,
+                'updated_at': cache_time.timestamp() if cache_time else None,
+                'data': data,
+                'changes': changes,
+                'removed': removed
+            }
+            self.cache_backend.set(f"market:{asset_type}:{shard}", snapshot)
+            self.snapshots[asset_type, shard] = (version, snapshot)
+        return version
+    
+    def cache_data(self, asset_type, shard, data):
         current_time = datetime.now()
-        if asset_type == 'stocks':
-            self.stocks_cache = data
-            self.stocks_cache_time = current_time
-        elif asset_type == 'crypto':
-            self.crypto_cache = data
-            self.crypto_cache_time = current_time
+        self.store_snapshot(asset_type, shard, data, current_time)
         
-        print(f"✓ Cached {asset_type} data at {current_time.strftime('%H:%M:%S')} ({len(data)} items)")
+        logger.info(f"✓ Cached {asset_type} shard {shard} at {current_time.strftime('%H:%M:%S')} ({len(data)} items)")
     
-    def get_market_data_with_cache(self, asset_type):
-        cached_data = self.get_cached_data(asset_type)
-        if cached_data:
-            return cached_data
-        
-        print(f"🔄 Fetching fresh {asset_type} data from API...")
-        if asset_type == 'stocks':
-            symbols = self.top_stocks
-        elif asset_type == 'crypto':
-            symbols = self.top_cryptos
-        else:
-            symbols = self.top_stocks
+    def get_symbols(self, asset_type):
+        return self.universe.symbols(asset_type)
+    
+    def shard_count(self, asset_type):
+        return len(self.universe.shards(asset_type))
+    
+    def shards_per_tick(self, asset_type, tick):
+        if self.max_shards_per_tick:
+            return self.max_shards_per_tick
+        # Enough shards per tick to cycle the whole universe within one interval.
+        interval = self.refresh_intervals.get(asset_type, self.cache_duration)
+        return max(1, math.ceil(self.shard_count(asset_type) * tick / interval))
+    
+    def get_shard_snapshot(self, asset_type, shard):
+        version = self.cache_backend.get(f"market:{asset_type}:{shard}:version")
+        with self.cache_lock:
+            local = self.snapshots.get((asset_type, shard))
+            if local and local[0] == version:
+                return local[1]
+        
+        snapshot = self.cache_backend.get(f"market:{asset_type}:{shard}")
+        if not snapshot:
+            return None
+        
+        with self.cache_lock:
+            self.snapshots[asset_type, shard] = (snapshot['version'], snapshot)
+        return snapshot
+    
+    def get_shard_entry(self, asset_type, shard):
+        snapshot = self.get_shard_snapshot(asset_type, shard)
+        if not snapshot:
+            return None, None
+        return snapshot['data'], self.snapshot_time(snapshot)
+    
+    @staticmethod
+    def snapshot_time(snapshot):
+        return datetime.fromtimestamp(snapshot['updated_at']) if snapshot['updated_at'] else None
+    
+    def get_asset_version(self, asset_type):
+        return self.cache_backend.get(f"market:{asset_type}:version")
+    
+    def get_epoch(self):
+        # Versions only compare within one counter: a per-process memory
+        # backend, or a flushed Redis, starts a new epoch.
+        if self.epoch is None:
+            # Set-if-absent, then read back, so workers racing on their first
+            # request all settle on the same epoch.
+            self.cache_backend.add("market:epoch", uuid.uuid4().hex[:8])
+            self.epoch = self.cache_backend.get("market:epoch")
+        return self.epoch
+    
+    def get_versioned_snapshot(self, asset_type):
+        counter = self.get_asset_version(asset_type)
+        with self.cache_lock:
+            local = self.assembled.get(asset_type)
+            if local and local['counter'] == counter:
+                return local
+        
+        data, times, changes, removed, symbol_times = {}, [], {}, {}, {}
+        version, shard_versions = 0, []
+        for shard in range(self.shard_count(asset_type)):
+            snapshot = self.get_shard_snapshot(asset_type, shard)
+            shard_versions.append(snapshot['version'] if snapshot else None)
+            if not snapshot:
+                continue
+            data.update(snapshot['data'])
+            symbol_times.update(dict.fromkeys(snapshot['data'], snapshot['updated_at'] or 0))
+            changes.update(snapshot.get('changes') or {})
+            removed.update(snapshot.get('removed') or {})
+            version = max(version, snapshot.get('asset_version') or 0)
+            if snapshot['updated_at']:
+                times.append(self.snapshot_time(snapshot))
+        
+        assembled = {
+            'counter': counter,
+            # The newest change actually visible in this view, not the
+            # counter, which another worker may already have bumped.
+            'version': version,
+            'data': data,
+            # The asset class is only as fresh as its oldest shard.
+            'cache_time': min(times) if times else None,
+            'changes': changes,
+            'removed': removed,
+            # When each symbol's shard was written, to tell newer live ticks apart.
+            'times': symbol_times,
+            'shards': tuple(shard_versions)
+        }
+        with self.cache_lock:
+            self.assembled[asset_type] = assembled
+        return assembled
+    
+    def get_cache_entry(self, asset_type):
+        snapshot = self.get_versioned_snapshot(asset_type)
+        return snapshot['data'], snapshot['cache_time']
+    
+    def get_delta(self, asset_type, since):
+        # Symbols whose quote or metadata moved after `since`; metadata fields
+        # are only resent when they themselves changed.
+        snapshot = self.get_versioned_snapshot(asset_type)
+        # Live quotes carry no version, so every symbol with a newer tick is
+        # resent; that set is bounded by the symbols actually ticking.
+        live, live_version = self.live_overlay(snapshot, snapshot['data'])
+        current = {**snapshot['data'], **live} if live else snapshot['data']
+        data = {}
+        for symbol, (quote_version, meta_version) in snapshot['changes'].items():
+            if meta_version > since:
+                data[symbol] = current[symbol]
+            elif quote_version > since or symbol in live:
+                data[symbol] = {field: value for field, value in current[symbol].items() if field not in self.meta_fields}
+        return {
+            'asset_type': asset_type,
+            'version': snapshot['version'],
+            'live': live_version,
+            'epoch': self.get_epoch(),
+            'since': since,
+            'updated_at': snapshot['cache_time'].isoformat() if snapshot['cache_time'] else None,
+            'data': data,
+            'removed': [symbol for symbol, version in snapshot['removed'].items() if version > since]
+        }
+    
+    def get_cache_time(self, asset_type):
+        return self.get_cache_entry(asset_type)[1]
+    
+    def get_cache_age(self, asset_type):
+        cache_time = self.get_cache_time(asset_type)
+        if cache_time is None:
+            return None
+        return (datetime.now() - cache_time).total_seconds()
+    
+    def due_shards(self, asset_type):
+        interval = self.refresh_intervals.get(asset_type, self.cache_duration)
+        now = datetime.now()
+        ages = []
+        for shard in range(self.shard_count(asset_type)):
+            _, cache_time = self.get_shard_entry(asset_type, shard)
+            age = (now - cache_time).total_seconds() if cache_time else float('inf')
+            if age >= interval:
+                ages.append((-age, shard))
+        return [(-age, shard) for age, shard in sorted(ages)]
+    
+    def shards_to_refresh(self, asset_type, tick):
+        # Rolling schedule: shards never fetched go at once, the rest only the
+        # oldest few per tick, so a large universe is refetched a slice at a time.
+        due = self.due_shards(asset_type)
+        missing = [shard for age, shard in due if age == float('inf')]
+        stale = [shard for age, shard in due if age != float('inf')]
+        return missing + stale[:self.shards_per_tick(asset_type, tick)]
+    
+    def refresh_shards(self, asset_type, shards):
+        loaded = [self.refresh_shard(asset_type, shard) for shard in shards]
+        return any(loaded)
+    
+    def refresh_shard(self, asset_type, shard):
+        return self.single_flight.do(f"market:{asset_type}:{shard}", self.refresh_once, asset_type, shard)
+    
+    def refresh_once(self, asset_type, shard):
+        # With a shared backend only one worker (or host) refreshes a shard at a time.
+        lock_name = f"refresh:{asset_type}:{shard}"
+        token = self.cache_backend.acquire_lock(lock_name, self.refresh_lock_ttl)
+        if token is None:
+            logger.info(f"⏭️ Another worker is refreshing {asset_type} shard {shard}")
+            metrics.inc('financegpt_refresh_total', asset_type=asset_type, outcome='skipped')
+            return False
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            loaded = self.fetch_and_cache(asset_type, shard)
+            outcome = 'ok' if loaded else 'empty'
+            return loaded
+        finally:
+            self.cache_backend.release_lock(lock_name, token)
+            metrics.observe('financegpt_refresh_seconds', time.perf_counter() - started, asset_type=asset_type)
+            metrics.inc('financegpt_refresh_total', asset_type=asset_type, outcome=outcome)
+    
+    def wait_for_snapshot(self, asset_type, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            data, cache_time = self.get_cache_entry(asset_type)
+            if data:
+                return data, cache_time
+            time.sleep(0.2)
+        return self.get_cache_entry(asset_type)
+    
+    def fetch_and_cache(self, asset_type, shard):
+        loaded = 0
+        for event in self.iter_and_cache(asset_type, [shard]):
+            if event['type'] == 'summary':
+                loaded = event['loaded']
+        return bool(loaded)
+    
+    def iter_and_cache(self, asset_type, shards=None):
+        shards = range(self.shard_count(asset_type)) if shards is None else shards
+        logger.info(f"🔄 Fetching fresh {asset_type} data from API ({len(shards)} shard(s))...")
+        started = time.monotonic()
+        loaded, total, failed = 0, 0, []
+        
+        for shard in shards:
+            symbols = self.universe.shard(asset_type, shard)
+            data = {}
+            for event in self.iter_market_data(symbols):
+                if event['type'] == 'record':
+                    data[event['symbol']] = event['data']
+                    self.live.publish(event['symbol'], event['data']['price'])
+                    self.notify(asset_type, event)
+                    yield event
+                else:
+                    loaded += event['loaded']
+                    total += event['total']
+                    failed += event['failed']
             
-        data = self.get_market_data(symbols)
-        self.cache_data(asset_type, data)
-        return data
+            if data:
+                self.cache_data(asset_type, shard, {symbol: data[symbol] for symbol in symbols if symbol in data})
+            else:
+                logger.warning(f"⚠️ Refresh of {asset_type} shard {shard} returned nothing - keeping last snapshot")
+        
+        yield {
+            'type': 'summary',
+            'loaded': loaded,
+            'total': total,
+            'failed': failed,
+            'elapsed': round(time.monotonic() - started, 3)
+        }
+    
+    def listen(self, asset_type):
+        listener = queue.Queue()
+        with self.cache_lock:
+            self.listeners[asset_type] = self.listeners.get(asset_type, ()) + (listener,)
+        return listener
+    
+    def unlisten(self, asset_type, listener):
+        with self.cache_lock:
+            self.listeners[asset_type] = tuple(l for l in self.listeners.get(asset_type, ()) if l is not listener)
+    
+    def notify(self, asset_type, event):
+        for listener in self.listeners.get(asset_type, ()):
+            listener.put(event)
+    
+    def stream_market_data(self, asset_type):
+        data, cache_time = self.get_cache_entry(asset_type)
+        if data and self.is_cache_valid(cache_time):
+            for symbol, record in data.items():
+                yield {'type': 'record', 'symbol': symbol, 'data': record}
+            yield {'type': 'summary', 'loaded': len(data), 'total': len(self.get_symbols(asset_type)), 'failed': [], 'cached': True}
+            return
+        
+        # Join the coalesced refresh of just the shards that are due, as the
+        # refresher would pick them: records are relayed as whichever thread
+        # leads each shard produces them, and the fresh shards plus whatever
+        # was stored before we attached (or by another worker) are replayed
+        # from the snapshot afterwards.
+        started = time.monotonic()
+        shards = self.shards_to_refresh(asset_type, self.refresher.tick)
+        listener = self.listen(asset_type)
+        
+        def run():
+            try:
+                self.refresh_shards(asset_type, shards)
+            except Exception as e:
+                logger.error(f"❌ Refresh of {asset_type} for a stream failed: {e}")
+            finally:
+                listener.put(None)
+        
+        sent = {}
+        try:
+            if shards:
+                threading.Thread(target=run, name=f'stream-refresh-{asset_type}', daemon=True).start()
+            else:
+                listener.put(None)
+            while (event := listener.get()) is not None:
+                sent[event['symbol']] = event['data']
+                yield event
+        finally:
+            self.unlisten(asset_type, listener)
+        
+        data, _ = self.get_cache_entry(asset_type)
+        if not data and not sent:
+            data, _ = self.wait_for_snapshot(asset_type, self.cold_wait)
+        for symbol, record in (data or {}).items():
+            if sent.get(symbol) != record:
+                sent[symbol] = record
+                yield {'type': 'record', 'symbol': symbol, 'data': record}
+        
+        symbols = self.get_symbols(asset_type)
+        yield {
+            'type': 'summary',
+            'loaded': len(sent),
+            'total': len(symbols),
+            'failed': [symbol for symbol in symbols if symbol not in sent],
+            'elapsed': round(time.monotonic() - started, 3)
+        }
+    
+    def trigger_refresh(self, asset_type):
+        # The refresher owns the rolling schedule; a request only wakes it.
+        self.refresher.start()
+        self.refresher.wake(asset_type)
+    
+    def get_snapshot(self, asset_type):
+        self.refresher.start()
+        
+        snapshot = self.get_versioned_snapshot(asset_type)
+        data, cache_time = snapshot['data'], snapshot['cache_time']
+        metrics.inc(
+            'financegpt_cache_requests_total', cache='market',
+            result='miss' if not data else 'hit' if self.is_cache_valid(cache_time) else 'stale'
+        )
+        if not data:
+            # Nothing to serve yet: start the missing shards in the background
+            # and answer as soon as the first one lands, whether this worker
+            # or another one fetched it. The rest fill in on later requests.
+            self.trigger_refresh(asset_type)
+            self.wait_for_snapshot(asset_type, self.cold_wait)
+            snapshot = self.get_versioned_snapshot(asset_type)
+            data, cache_time = snapshot['data'], snapshot['cache_time']
+        
+        # Stale shards are left to the refresher's next tick.
+        age = (datetime.now() - cache_time).total_seconds() if cache_time else None
+        
+        live, live_version = self.live_overlay(snapshot, data)
+        if live:
+            data = {**data, **live}
+        
+        return {
+            'asset_type': asset_type,
+            'version': snapshot['version'],
+            'live': live_version,
+            'epoch': self.get_epoch(),
+            'data': data or {},
+            'updated_at': cache_time.isoformat() if cache_time else None,
+            'age': round(age, 1) if age is not None else None,
+            'stale': not self.is_cache_valid(cache_time)
+        }
+    
+    def live_overlay(self, snapshot, symbols):
+        # Records for symbols whose latest tick is newer than their shard and
+        # moved the price, plus a version for them (the newest tick, in ms).
+        # The daily change is re-based on the previous close the snapshot implies.
+        overlay, newest = {}, 0.0
+        for symbol, (price, ts) in self.live.latest_many(symbols).items():
+            record = snapshot['data'].get(symbol)
+            if record is None or ts <= snapshot['times'].get(symbol, 0) or price == record['price']:
+                continue
+            previous_close = record['price'] / (1 + record['change_pct'] / 100) if record['change_pct'] > -100 else 0
+            overlay[symbol] = {
+                **record,
+                'price': price,
+                'change_pct': (price / previous_close - 1) * 100 if previous_close else record['change_pct'],
+                'quote_time': datetime.fromtimestamp(ts).isoformat()
+            }
+            newest = max(newest, ts)
+        return overlay, int(newest * 1000)
+    
+    def get_index(self, asset_type=None):
+        # asset_type None indexes every asset class together.
+        # Keyed on the stored shard versions, so the argsorts are redone once
+        # per completed shard, not per request while the refresher runs.
+        asset_types = [asset_type] if asset_type else self.universe.asset_types()
+        snapshots = [self.get_versioned_snapshot(name) for name in asset_types]
+        version = tuple(snapshot['shards'] for snapshot in snapshots)
+        with self.cache_lock:
+            index = self.indexes.get(asset_type)
+            if index and index.version == version:
+                return index
+        
+        rows = []
+        for name, snapshot in zip(asset_types, snapshots):
+            data = snapshot['data']
+            rows.extend((name, symbol, data[symbol]) for symbol in self.get_symbols(name) if symbol in data)
+        index = MarketIndex(rows, version)
+        with self.cache_lock:
+            self.indexes[asset_type] = index
+        return index
+    
+    def query(self, asset_type=None, sort='market_cap', order='desc', page=1, page_size=50, **filters):
+        # Served from the shared snapshots only; a cold universe fills in as
+        # the background refresher works through its shards.
+        self.refresher.start()
+        index = self.get_index(asset_type)
+        total, items = index.query(
+            sort=sort, order=order, offset=(page - 1) * page_size, limit=page_size, **filters
+        )
+        # Ranking uses the snapshot; the page itself shows live prices.
+        for name in {item['asset_type'] for item in items}:
+            live, _ = self.live_overlay(
+                self.get_versioned_snapshot(name), [item['symbol'] for item in items if item['asset_type'] == name]
+            )
+            for item in items:
+                if item['symbol'] in live:
+                    item.update(live[item['symbol']])
+        ages = [self.get_cache_age(name) for name in ([asset_type] if asset_type else self.universe.asset_types())]
+        ages = [age for age in ages if age is not None]
+        return {
+            'asset_type': asset_type or 'all',
+            'sort': sort,
+            'order': order,
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'pages': math.ceil(total / page_size) if total else 0,
+            'indexed': len(index),
+            'universe': sum(len(self.get_symbols(name)) for name in ([asset_type] if asset_type else self.universe.asset_types())),
+            'age': round(max(ages), 1) if ages else None,
+            'items': items
+        }
+    
+    def get_market_data_with_cache(self, asset_type):
+        return self.get_snapshot(asset_type)['data']
 
     def get_market_data(self, symbols):
         data = {}
-        successful_count = 0
+        for event in self.iter_market_data(symbols):
+            if event['type'] == 'record':
+                data[event['symbol']] = event['data']
+        return {symbol: data[symbol] for symbol in symbols if symbol in data}
+    
+    def iter_market_data(self, symbols):
+        symbols = list(symbols)
+        started = time.monotonic()
+        loaded = 0
         failed_symbols = []
         
-        print(f"📊 Fetching data for {len(symbols)} symbols...")
+        logger.info(f"📊 Fetching data for {len(symbols)} symbols...")
         
-        for i, symbol in enumerate(symbols):
-            try:
-                if i > 0:
-                    delay = random.uniform(0.5, 1.5)
-                    time.sleep(delay)
-                
-                print(f"  [{i+1}/{len(symbols)}] Fetching {symbol}...", end=' ')
-                
-                ticker = yf.Ticker(symbol)
-                hist = ticker.history(period="5d")
-                if len(hist) == 0:
-                    print("❌ No history")
-                    failed_symbols.append(symbol)
-                    continue
-                
-                current_price = hist['Close'].iloc[-1]
-                
-                if len(hist) >= 2:
-                    prev_price = hist['Close'].iloc[-2]
-                    change_pct = ((current_price - prev_price) / prev_price) * 100
-                else:
-                    change_pct = 0
-                
+        self.update_history(symbols)
+        stats = self.analytics.compute(symbols)
+        
+        missing = [symbol for symbol in symbols if symbol not in stats]
+        if missing:
+            # Not in the bulk download, retry just those before giving up.
+            metrics.inc('financegpt_upstream_retries_total', provider='yfinance')
+            self.update_history(missing, max_age=0)
+            stats.update(self.analytics.compute(missing))
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {
+                executor.submit(self.build_symbol_record, symbol, stats.get(symbol)): symbol
+                for symbol in symbols
+            }
+            for future in as_completed(futures):
+                symbol = futures[future]
                 try:
-                    info = ticker.info
-                    if info and isinstance(info, dict):
-                        name = info.get('longName') or info.get('shortName') or symbol
-                        market_cap = info.get('marketCap', 0)
-                    else:
-                        name = symbol
-                        market_cap = 0
-                except:
-                    name = symbol
-                    market_cap = 0
+                    record = future.result()
+                except Exception as e:
+                    logger.debug("  %s: ❌ Error: %.50s...", symbol, e)
+                    record = None
                 
-                logo_url = self.get_company_logo(symbol)
-                
-                data[symbol] = {
-                    'price': float(current_price),
-                    'change_pct': float(change_pct),
-                    'market_cap': int(market_cap) if market_cap else 0,
-                    'name': str(name),
-                    'logo_url': logo_url
-                }
-                successful_count += 1
-                print(f"✓ ${current_price:.2f}")
-                
-            except Exception as e:
-                print(f"❌ Error: {str(e)[:50]}...")
-                failed_symbols.append(symbol)
-                
-                if "429" in str(e) or "Too Many Requests" in str(e):
-                    print("⏳ Rate limited - waiting 5 seconds...")
-                    time.sleep(5)
+                if record:
+                    loaded += 1
+                    logger.debug("  %s: ✓ $%.2f", symbol, record['price'])
+                    yield {'type': 'record', 'symbol': symbol, 'data': record}
+                else:
+                    failed_symbols.append(symbol)
+        finally:
+            # A client that disconnects mid-stream should not keep the pool busy.
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.registry.save()
         
-        print(f"📈 Successfully loaded {successful_count}/{len(symbols)} symbols")
+        logger.info(f"📈 Successfully loaded {loaded}/{len(symbols)} symbols")
         if failed_symbols:
-            print(f"❌ Failed: {', '.join(failed_symbols[:5])}{'...' if len(failed_symbols) > 5 else ''}")
+            logger.warning(f"❌ Failed: {', '.join(failed_symbols[:5])}{'...' if len(failed_symbols) > 5 else ''}")
         
-        return data
+        yield {
+            'type': 'summary',
+            'loaded': loaded,
+            'total': len(symbols),
+            'failed': failed_symbols,
+            'elapsed': round(time.monotonic() - started, 3)
+        }
+    
+    def update_history(self, symbols, max_age=None):
+        try:
+            self.price_store.update(symbols, max_age=max_age)
+        except Exception as e:
+            logger.error(f"❌ History update failed, using stored bars: {str(e)[:50]}...")
+    
+    def build_symbol_record(self, symbol, stats=None):
+        if not stats:
+            return None
+        
+        with symbol_timer('market', symbol):
+            return self.build_record(symbol, stats)
+    
+    def build_record(self, symbol, stats):
+        stale = self.registry.stale_fields(symbol)
+        metrics.inc('financegpt_cache_requests_total', cache='symbol_registry', result='miss' if stale else 'hit')
+        if stale:
+            try:
+                info = self.governor.call('yfinance', lambda: yf.Ticker(symbol).info)
+                if info and isinstance(info, dict):
+                    fields = {
+                        'name': str(info.get('longName') or info.get('shortName') or symbol),
+                        'market_cap': int(info.get('marketCap') or 0)
+                    }
+                    website = info.get('website')
+                    if website and not self.registry.get(symbol)['domain']:
+                        domain = (urlparse(website).hostname or '').removeprefix('www.') or None
+                        fields.update(domain=domain, logo_url=self.registry.logo_for(symbol, domain))
+                    self.registry.update(symbol, **fields)
+            except Exception:
+                # Keep serving whatever the registry already has.
+                pass
+        
+        entry = self.registry.get(symbol)
+        record = {
+            'price': stats['current_price'],
+            'change_pct': stats['change_1d'],
+            'change_7d': stats['change_7d'],
+            'change_30d': stats['change_30d'],
+            'volatility': stats['volatility'],
+            'market_cap': entry['market_cap'],
+            'name': entry['name'],
+            'logo_url': entry['logo_url']
+        }
+        return record
     
     def get_company_logo(self, symbol):
-        if symbol.endswith('-USD'):
-            crypto_mapping = {
-                'BTC-USD': 'https://assets.coingecko.com/coins/images/1/large/bitcoin.png',
-                'ETH-USD': 'https://assets.coingecko.com/coins/images/279/large/ethereum.png',
-                'USDT-USD': 'https://assets.coingecko.com/coins/images/325/large/Tether.png',
-                'XRP-USD': 'https://assets.coingecko.com/coins/images/44/large/xrp-symbol-white-128.png',
-                'BNB-USD': 'https://assets.coingecko.com/coins/images/825/large/bnb-icon2_2x.png',
-                'SOL-USD': 'https://assets.coingecko.com/coins/images/4128/large/solana.png',
-                'ADA-USD': 'https://assets.coingecko.com/coins/images/975/large/cardano.png',
-                'DOGE-USD': 'https://assets.coingecko.com/coins/images/5/large/dogecoin.png',
-                'DOT-USD': 'https://assets.coingecko.com/coins/images/12171/large/polkadot.png',
-                'MATIC-USD': 'https://assets.coingecko.com/coins/images/4713/large/matic-token-icon.png',
-                'LTC-USD': 'https://assets.coingecko.com/coins/images/2/large/litecoin.png',
-                'SHIB-USD': 'https://assets.coingecko.com/coins/images/11939/large/shiba.png',
-                'WLD-USD': 'https://assets.coingecko.com/coins/images/31069/large/worldcoin.jpeg',
-                'HNT-USD': 'https://assets.coingecko.com/coins/images/4284/large/Helium_HNT.png',
-                'AVAX-USD': 'https://assets.coingecko.com/coins/images/12559/large/Avalanche_Circle_RedWhite_Trans.png',
-                'LINK-USD': 'https://assets.coingecko.com/coins/images/877/large/chainlink-new-logo.png'
-            }
-            return crypto_mapping.get(symbol, None)
-        else:
-            domain = self.get_company_domain(symbol)
-            if domain:
-                return f"https://logo.clearbit.com/{domain}"
-        return None
+        return self.registry.get(symbol)['logo_url']
     
     def get_company_domain(self, symbol):
-        domain_mapping = {
-            'MSFT': 'microsoft.com', 'NVDA': 'nvidia.com', 'AAPL': 'apple.com', 
-            'AMZN': 'amazon.com', 'GOOGL': 'google.com', 'META': 'meta.com', 
-            'AVGO': 'broadcom.com', 'TCEHY': 'tencent.com', 'TSLA': 'tesla.com', 
-            'TSM': 'tsmc.com', 'UNH': 'unitedhealthgroup.com', 'JPM': 'jpmorganchase.com', 
-            'LLY': 'lilly.com', 'ORCL': 'oracle.com', 'ASML': 'asml.com', 
-            'BABA': 'alibaba.com', 'NFLX': 'netflix.com', 'MA': 'mastercard.com', 
-            'XOM': 'exxonmobil.com', 'PLTR': 'palantir.com', 'COST': 'costco.com',
-            'KO': 'coca-cola.com', 'PFE': 'pfizer.com', 'PG': 'pg.com', 
-            'JNJ': 'jnj.com', 'HD': 'homedepot.com', 'CVX': 'chevron.com',
-            'WFC': 'wellsfargo.com', 'SAP': 'sap.com', 'ABBV': 'abbvie.com'
+        return self.registry.get(symbol)['domain']
+
+class QuantScreener:
+    # Deterministic NumPy scoring over the whole universe. Every symbol gets a
+    # baseline prediction in the same shape as a Groq answer; only the top
+    # `budget` symbols whose context changed or that stand out from their
+    # peers are worth a model call.
+    model = 'quant-screen-v1'
+    features = ('change_7d', 'change_30d', 'volatility', 'max_drawdown')
+    
+    def __init__(self, analytics=None, universe=None, sentiment=None, budget=10, unusual_threshold=2.0, enabled=True):
+        self.analytics = analytics or market_analytics
+        self.universe = universe or symbol_universe
+        self.sentiment = sentiment or sentiment_engine
+        self.budget = budget
+        self.unusual_threshold = unusual_threshold
+        self.enabled = enabled
+        # Context fingerprint per symbol as of its last escalation or dismissal.
+        self.seen = {}
+        self.lock = threading.Lock()
+        self.counts = {'cached': 0, 'baseline': 0, 'escalated': 0}
+    
+    def score(self, symbols):
+        symbols = list(symbols)
+        requested = set(symbols)
+        # Stored history for the rest of the universe is free to read and
+        # gives the z-scores a real cross-section to rank against.
+        peers = [
+            symbol for asset_type in self.universe.asset_types()
+            for symbol in self.universe.symbols(asset_type) if symbol not in requested
+        ]
+        stats = self.analytics.compute(symbols + peers)
+        names = [symbol for symbol in symbols + peers if symbol in stats]
+        if not names:
+            return {}
+        
+        columns = np.array([[stats[symbol][field] for field in self.features] for symbol in names])
+        price = np.array([stats[symbol]['current_price'] for symbol in names])
+        sma_20 = np.array([stats[symbol]['sma_20'] for symbol in names])
+        sentiment = np.array([
+            np.nan if (score := self.sentiment.symbol_score(symbol)) is None else score
+            for symbol in names
+        ])
+        
+        # Robust z-scores (median / MAD), crypto and equities ranked separately.
+        z = np.zeros_like(columns)
+        crypto = np.array([symbol.endswith('-USD') for symbol in names])
+        for group in (crypto, ~crypto):
+            if group.any():
+                median = np.median(columns[group], axis=0)
+                mad = np.median(np.abs(columns[group] - median), axis=0) * 1.4826
+                z[group] = (columns[group] - median) / np.where(mad > 0, mad, 1)
+        
+        change_7d, change_30d, volatility = columns[:, 0], columns[:, 1], columns[:, 2]
+        weekly = np.maximum(volatility, 1.0) / np.sqrt(52)
+        monthly = np.maximum(volatility, 1.0) / np.sqrt(12)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            trend = np.nan_to_num((price / sma_20 - 1) * 100)
+        known_sentiment = np.nan_to_num(sentiment)
+        
+        # Risk-adjusted momentum, nudged by news tone, squashed into [-1, 1].
+        signal = np.tanh((0.5 * change_7d / weekly + 0.3 * change_30d / monthly
+                          + 0.2 * trend / weekly + 2 * known_sentiment) / 2)
+        unusual = np.max(np.abs(z), axis=1) + 2 * np.abs(known_sentiment)
+        
+        expected_7d = signal * weekly * 0.5
+        expected_30d = signal * monthly * 0.5
+        confidence_7d = np.clip(40 + 40 * np.abs(signal) - volatility / 4, 10, 85)
+        
+        results = {}
+        for row, symbol in enumerate(names):
+            if symbol not in requested:
+                continue
+            results[symbol] = {
+                'stats': stats[symbol],
+                'score': float(unusual[row] + abs(signal[row])),
+                'unusual': float(unusual[row]),
+                'prediction': self.build_prediction(
+                    symbol, stats[symbol], float(signal[row]),
+                    float(expected_7d[row]), float(expected_30d[row]), int(confidence_7d[row]),
+                    None if np.isnan(sentiment[row]) else float(sentiment[row]), float(trend[row])
+                )
+            }
+        return results
+    
+    def build_prediction(self, symbol, stats, signal, expected_7d, expected_30d, confidence_7d, sentiment, trend):
+        price = stats['current_price']
+        direction = 'bullish' if signal > 0.2 else 'bearish' if signal < -0.2 else 'neutral'
+        risk_level = volatility_bucket(stats['volatility'])
+        
+        key_factors = [
+            f"7-day change {stats['change_7d']:+.1f}%",
+            f"{risk_level.capitalize()} volatility ({stats['volatility']:.1f}% annualized)",
+            f"Price {abs(trend):.1f}% {'above' if trend >= 0 else 'below'} 20-day average"
+        ]
+        if sentiment is not None:
+            key_factors.append(f"News sentiment {sentiment:+.2f}")
+        
+        return {
+            'price_target_7d': round(price * (1 + expected_7d / 100), 2),
+            'price_target_30d': round(price * (1 + expected_30d / 100), 2),
+            'confidence_7d': confidence_7d,
+            'confidence_30d': max(10, confidence_7d - 10),
+            'direction': direction,
+            'risk_level': risk_level,
+            'recommendation': {'bullish': 'buy', 'bearish': 'sell'}.get(direction, 'hold'),
+            'key_factors': key_factors,
+            'reasoning': (
+                f"Momentum score {signal:+.2f} from 7- and 30-day returns scaled by volatility"
+                f"{' and recent news tone' if sentiment is not None else ''}; "
+                f"targets assume half of one period's typical move in that direction."
+            ),
+            'symbol': symbol,
+            'current_price': round(price, 2),
+            'timestamp': datetime.now().isoformat(),
+            'ai_model': self.model,
+            'powered_by': 'Quant pre-screen'
         }
-        return domain_mapping.get(symbol, None)
+    
+    def select(self, scored, fingerprints):
+        # Candidates changed since they were last looked at or are unusual
+        # right now; the highest scores win the budget. Changed symbols that
+        # miss out stay changed and compete again next sweep.
+        with self.lock:
+            candidates = [
+                symbol for symbol, entry in scored.items()
+                if self.seen.get(symbol) != fingerprints[symbol] or entry['unusual'] >= self.unusual_threshold
+            ]
+            candidates.sort(key=lambda symbol: scored[symbol]['score'], reverse=True)
+            escalate = candidates[:self.budget]
+            
+            for symbol in scored:
+                if symbol in escalate or symbol not in candidates:
+                    self.seen[symbol] = fingerprints[symbol]
+            return escalate
+    
+    def record(self, outcome, count=1):
+        if not count:
+            return
+        with self.lock:
+            self.counts[outcome] += count
+        metrics.inc('financegpt_prescreen_total', count, outcome=outcome)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'budget': self.budget,
+                'unusual_threshold': self.unusual_threshold,
+                **self.counts
+            }
 
 class GroqStockPredictor:
-    def __init__(self):
+    def __init__(self, store=None, analytics=None):
+        self.price_store = store or price_store
+        self.analytics = analytics or market_analytics
         self.api_key = os.getenv('GROQ_API_KEY')
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
+        self.api_url = os.getenv('GROQ_API_URL', "https://api.groq.com/openai/v1/chat/completions")
         self.model = "llama-3.3-70b-versatile"
         
-        self.prediction_cache = {}
-        self.cache_duration = 3600
+        self.max_concurrency = int(os.getenv('GROQ_MAX_CONCURRENCY', '8'))
+        self.timeout = (3.05, float(os.getenv('GROQ_READ_TIMEOUT', '10')))
+        self.max_retry_wait = 4
+        self.governor = upstream_governor
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='groq')
+        
+        # One keep-alive pool sized to the concurrency cap, shared by every call.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        
+        self.prediction_cache = PredictionCache(
+            os.getenv('PREDICTION_CACHE_PATH', os.path.join(DATA_DIR, 'predictions.json')),
+            max_size=int(os.getenv('PREDICTION_CACHE_SIZE', '500')),
+            max_age=int(os.getenv('PREDICTION_MAX_AGE', str(4 * 3600))),
+            drift_threshold=float(os.getenv('PREDICTION_DRIFT_THRESHOLD', '2.0')),
+            backend=cache_backend if cache_backend.shared else None
+        )
+        self.single_flight = SingleFlight()
+        # Batch calls score every symbol locally and spend at most
+        # GROQ_ESCALATION_BUDGET model requests per call on the rest.
+        self.screener = QuantScreener(
+            analytics=self.analytics,
+            budget=int(os.getenv('GROQ_ESCALATION_BUDGET', '10')),
+            unusual_threshold=float(os.getenv('PRESCREEN_UNUSUAL_Z', '2.0')),
+            enabled=os.getenv('PREDICTION_PRESCREEN', '1') == '1'
+        )
     
-    def is_cache_valid(self, cache_time):
-        if cache_time is None:
-            return False
-        return (datetime.now() - cache_time).total_seconds() < self.cache_duration
+    def get_ai_prediction(self, symbol, context=None):
+        with symbol_timer('prediction', symbol):
+            return self.single_flight.do(f"prediction:{symbol}", self.fetch_ai_prediction, symbol, context)
     
-    def get_ai_prediction(self, symbol):
+    def fetch_ai_prediction(self, symbol, context=None):
         try:
-            cache_key = f"groq_{symbol}"
-            if cache_key in self.prediction_cache:
-                cached_pred, cache_time = self.prediction_cache[cache_key]
-                if self.is_cache_valid(cache_time):
-                    print(f"✅ Using cached Groq prediction for {symbol}")
-                    return cached_pred
-    
-            context = self.get_stock_context(symbol)
+            context = context or self.get_stock_context(symbol)
             if not context:
                 return None
             
-            trend_direction = "bullish" if context['change_7d'] > 2 else "bearish" if context['change_7d'] < -2 else "neutral"
-            volatility = "high" if abs(context['change_7d']) > 5 else "low" if abs(context['change_7d']) < 1 else "medium"
+            cached_pred = self.prediction_cache.get(context)
+            if cached_pred:
+                logger.debug("✅ Using cached Groq prediction for %s", symbol)
+                return cached_pred
             
-            prompt = f"""You are a professional stock analyst. Analyze {symbol} based on the following data:
-
-Current Price: ${context['current_price']}
-7-day change: {context['change_7d']}%
-30-day change: {context['change_30d']}%
-Recent trend: {trend_direction}
-Volatility: {volatility}
-
-"Consider that recent market volatility may be due to external factors rather than fundamental weakness"
-"Distinguish between temporary market shocks and underlying asset fundamentals"
-
-Provide a realistic analysis. Consider:
-- If 7-day change is very negative (< -5%), lean toward bearish/sell
-- If 7-day change is very positive (> 5%), consider if it's overextended
-- If change is moderate, provide balanced view
-- Price targets should reflect realistic expectations, not always growth
-
-Respond with ONLY this JSON format (replace values with your analysis):
-{{
-    "price_target_7d": [calculate realistic 7-day target],
-    "price_target_30d": [calculate realistic 30-day target],
-    "confidence_7d": [1-100 based on data quality],
-    "confidence_30d": [1-100 based on uncertainty],
-    "direction": "[bullish/bearish/neutral based on analysis]",
-    "risk_level": "[low/medium/high based on volatility]",
-    "recommendation": "[buy/sell/hold based on analysis]",
-    "key_factors": ["factor1", "factor2", "factor3"],
-    "reasoning": "Your analytical reasoning here"
-}}"""
-        
-            data = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": "You are an expert financial analyst. Always respond with valid JSON only."},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.3,
-                "max_tokens": 500
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            data = self.build_request(symbol, context)
             
             max_retries = 3
             for attempt in range(max_retries):
+                if attempt:
+                    metrics.inc('financegpt_upstream_retries_total', provider='groq')
                 try:
-                    print(f"🤖 Asking Groq AI about {symbol} (attempt {attempt + 1}/{max_retries})...")
+                    logger.debug("🤖 Asking Groq AI about %s (attempt %d/%d)...", symbol, attempt + 1, max_retries)
                     
-                    timeout = 15 + (attempt * 10)
-                    response = requests.post(self.api_url, json=data, headers=headers, timeout=timeout)
+                    response = self.governor.request('groq', self.session.post, self.api_url, json=data, timeout=self.timeout)
                     
                     if response.status_code == 200:
-                        response_json = response.json()
-                        
-                        if "choices" in response_json and len(response_json["choices"]) > 0:
-                            ai_response = response_json["choices"][0]["message"]["content"]
-                            
-                            try:
-                                prediction = json.loads(ai_response)
-                                
-                                prediction.update({
-                                    'symbol': symbol,
-                                    'current_price': context['current_price'],
-                                    'timestamp': datetime.now().isoformat(),
-                                    'ai_model': self.model,
-                                    'powered_by': 'Groq AI'
-                                })
-                                
-                                self.prediction_cache[cache_key] = (prediction, datetime.now())
-                                
-                                print(f"✅ Groq AI prediction for {symbol}: {prediction['direction']}")
-                                return prediction
-                                
-                            except json.JSONDecodeError as e:
-                                print(f"❌ JSON parsing error: {e}")
-                                if attempt == max_retries - 1:
-                                    return None
-                                continue
-                        else:
-                            print("❌ No valid response from Groq")
-                            if attempt == max_retries - 1:
-                                return None
-                            continue
+                        prediction = self.parse_response(symbol, context, response.json())
+                        if prediction:
+                            self.prediction_cache.put(context, prediction)
+                            logger.debug("✅ Groq AI prediction for %s: %s", symbol, prediction.get('direction'))
+                            return prediction
+                        if attempt == max_retries - 1:
+                            return None
+                        continue
                             
                     elif response.status_code == 429:
-                        print(f"⏳ Rate limited - waiting {5 * (attempt + 1)} seconds...")
-                        time.sleep(5 * (attempt + 1))
+                        # The governor has already slowed the groq bucket down,
+                        # so the next attempt waits its turn there.
+                        logger.debug("⏳ Groq rate limited on attempt %d/%d", attempt + 1, max_retries)
                         continue
                         
                     else:
-                        print(f"❌ Groq API Error: {response.status_code}")
+                        logger.warning(f"❌ Groq API Error: {response.status_code}")
                         if attempt == max_retries - 1:
                             return None
                         continue
                         
                 except requests.exceptions.Timeout:
-                    print(f"⏰ Timeout on attempt {attempt + 1}/{max_retries}")
+                    logger.debug("⏰ Timeout on attempt %d/%d", attempt + 1, max_retries)
                     if attempt < max_retries - 1:
-                        wait_time = 2 ** attempt
-                        print(f"⏳ Waiting {wait_time}s before retry...")
+                        wait_time = self.governor.backoff(attempt, cap=self.max_retry_wait)
+                        logger.debug("⏳ Waiting %.1fs before retry...", wait_time)
                         time.sleep(wait_time)
                         continue
                     else:
-                        print("❌ All retry attempts failed due to timeout")
+                        logger.warning("❌ All retry attempts failed due to timeout")
                         return None
                         
                 except requests.exceptions.ConnectionError:
-                    print(f"🌐 Connection error on attempt {attempt + 1}/{max_retries}")
+                    logger.debug("🌐 Connection error on attempt %d/%d", attempt + 1, max_retries)
                     if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)
+                        time.sleep(self.governor.backoff(attempt, cap=self.max_retry_wait))
                         continue
                     else:
                         return None
                     
             return None
-            
-        except Exception as e:
-            print(f"❌ Groq prediction error: {e}")
+            
+        except Exception as e:
+            logger.error(f"❌ Groq prediction error: {e}")
+            return None
+    
+    def build_request(self, symbol, context):
+        trend_direction = context['trend']
+        volatility = f"{context['volatility_bucket']} ({context['volatility']}% annualized)"
+        
+        prompt = f"""You are a professional stock analyst. Analyze {symbol} based on the following data:
+
+Current Price: ${context['current_price']}
+7-day change: {context['change_7d']}%
+30-day change: {context['change_30d']}%
+Max drawdown (30d): {context['max_drawdown']}%
+20-day moving average: ${context['sma_20']}
+Recent trend: {trend_direction}
+Volatility: {volatility}
+
+"Consider that recent market volatility may be due to external factors rather than fundamental weakness"
+"Distinguish between temporary market shocks and underlying asset fundamentals"
+
+Provide a realistic analysis. Consider:
+- If 7-day change is very negative (< -5%), lean toward bearish/sell
+- If 7-day change is very positive (> 5%), consider if it's overextended
+- If change is moderate, provide balanced view
+- Price targets should reflect realistic expectations, not always growth
+
+Respond with ONLY this JSON format (replace values with your analysis):
+{{
+    "price_target_7d": [calculate realistic 7-day target],
+    "price_target_30d": [calculate realistic 30-day target],
+    "confidence_7d": [1-100 based on data quality],
+    "confidence_30d": [1-100 based on uncertainty],
+    "direction": "[bullish/bearish/neutral based on analysis]",
+    "risk_level": "[low/medium/high based on volatility]",
+    "recommendation": "[buy/sell/hold based on analysis]",
+    "key_factors": ["factor1", "factor2", "factor3"],
+    "reasoning": "Your analytical reasoning here"
+}}"""
+        
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "You are an expert financial analyst. Always respond with valid JSON only."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 500
+        }
+    
+    def parse_response(self, symbol, context, response_json):
+        if not response_json.get("choices"):
+            logger.warning("❌ No valid response from Groq")
+            return None
+        
+        ai_response = response_json["choices"][0]["message"]["content"]
+        try:
+            prediction = json.loads(ai_response)
+        except json.JSONDecodeError as e:
+            logger.warning(f"❌ JSON parsing error: {e}")
             return None
+        
+        prediction.update({
+            'symbol': symbol,
+            'current_price': context['current_price'],
+            'timestamp': datetime.now().isoformat(),
+            'ai_model': self.model,
+            'powered_by': 'Groq AI'
+        })
+        return prediction
+    
+    def screen(self, symbols):
+        # Returns the predictions that need no model call and, for the
+        # symbols worth one, their context and baseline fallback.
+        symbols = list(dict.fromkeys(symbols))
+        try:
+            self.price_store.update(symbols)
+        except Exception as e:
+            logger.warning(f"⚠️ History update failed, screening stored bars: {e}")
+        
+        scored = self.screener.score(symbols)
+        ready, contexts, cached = {}, {}, 0
+        for symbol in symbols:
+            if symbol not in scored:
+                ready[symbol] = None
+                continue
+            context = self.build_context(symbol, scored[symbol]['stats'])
+            cached_pred = self.prediction_cache.get(context)
+            if cached_pred:
+                ready[symbol] = cached_pred
+                cached += 1
+            else:
+                contexts[symbol] = context
+        
+        escalate = self.screener.select(
+            {symbol: scored[symbol] for symbol in contexts},
+            {symbol: self.prediction_cache.fingerprint(context) for symbol, context in contexts.items()}
+        )
+        for symbol in contexts:
+            if symbol not in escalate:
+                ready[symbol] = scored[symbol]['prediction']
+        
+        self.screener.record('cached', cached)
+        self.screener.record('baseline', len(contexts) - len(escalate))
+        self.screener.record('escalated', len(escalate))
+        logger.info(f"🧮 Screened {len(symbols)} symbols, escalating {len(escalate)} to Groq")
+        return ready, {symbol: (contexts[symbol], scored[symbol]['prediction']) for symbol in escalate}
+    
+    def escalate(self, symbol, context, baseline):
+        # A failed model call still answers with the baseline.
+        return self.get_ai_prediction(symbol, context) or baseline
+    
+    def predict_many(self, symbols):
+        if self.screener.enabled:
+            ready, escalate = self.screen(symbols)
+            yield from ready.items()
+        else:
+            escalate = {symbol: (None, None) for symbol in dict.fromkeys(symbols)}
+        
+        futures = {
+            self.executor.submit(self.escalate, symbol, context, baseline): symbol
+            for symbol, (context, baseline) in escalate.items()
+        }
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Drop anything still queued if the consumer stops early.
+            for future in futures:
+                future.cancel()
     
     def get_stock_context(self, symbol):
         try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period="1mo")
-            if len(hist) == 0:
+            try:
+                self.price_store.update([symbol])
+            except Exception as e:
+                logger.warning(f"⚠️ History update for {symbol} failed, using stored bars: {e}")
+            
+            stats = self.analytics.get(symbol)
+            if not stats:
                 return None
-                
-            current_price = hist['Close'].iloc[-1]
-            price_7d_ago = hist['Close'].iloc[-7] if len(hist) >= 7 else current_price
-            price_30d_ago = hist['Close'].iloc[0]
+            return self.build_context(symbol, stats)
             
-            change_7d = ((current_price - price_7d_ago) / price_7d_ago) * 100
-            change_30d = ((current_price - price_30d_ago) / price_30d_ago) * 100
+        except Exception as e:
+            return None
+    
+    def build_context(self, symbol, stats):
+        return {
+            'symbol': symbol,
+            'current_price': round(stats['current_price'], 2),
+            'change_7d': round(stats['change_7d'], 2),
+            'change_30d': round(stats['change_30d'], 2),
+            'volatility': round(stats['volatility'], 1),
+            'max_drawdown': round(stats['max_drawdown'], 2),
+            'sma_20': round(stats['sma_20'], 2),
+            'trend': trend_bucket(stats['change_7d']),
+            'volatility_bucket': volatility_bucket(stats['volatility'])
+        }
+
+class SentimentEngine:
+    def __init__(self, path, max_size=5000, save_interval=60):
+        self.path = path
+        self.max_size = max_size
+        self.save_interval = save_interval
+        self.cache = None
+        self.dirty = False
+        self.last_save = time.monotonic()
+        self.analyzer = None
+        self.lock = threading.RLock()
+        
+        self.articles_scored = 0
+        self.cache_hits = 0
+        self.scoring_seconds = 0.0
+        
+        # Latest news tone per symbol, for the prediction pre-screen.
+        self.symbol_scores = {}
+        self.symbol_max_age = float(os.getenv('SENTIMENT_SYMBOL_MAX_AGE', str(6 * 3600)))
+    
+    def load(self):
+        with self.lock:
+            if self.cache is not None:
+                return
+            self.cache = OrderedDict()
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path) as f:
+                        self.cache.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Ignoring unreadable sentiment cache: {e}")
+    
+    def save(self, force=False):
+        with self.lock:
+            if not self.dirty or (not force and time.monotonic() - self.last_save < self.save_interval):
+                return
+            self.last_save = time.monotonic()
+            try:
+                write_json_atomic(self.path, self.cache)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"⚠️ Could not save sentiment cache: {e}")
+                return
+            self.dirty = False
+    
+    def get_analyzer(self):
+        if self.analyzer is None:
+            # Concurrent first requests build it once; the degraded mode is
+            # announced at startup.
+            with self.lock:
+                if self.analyzer is None:
+                    if ensure_vader_lexicon():
+                        self.analyzer = nltk_sentiment.SentimentIntensityAnalyzer()
+                    else:
+                        logger.debug("VADER lexicon missing - scoring with TextBlob only")
+                        self.analyzer = False
+        return self.analyzer
+    
+    def article_key(self, article):
+        text = f"{article.get('url') or ''}\n{article.get('title') or ''}"
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+    
+    def score_text(self, text):
+        analyzer = self.get_analyzer()
+        polarity = textblob.TextBlob(text).sentiment.polarity
+        if analyzer:
+            return round((analyzer.polarity_scores(text)['compound'] + polarity) / 2, 4)
+        return round(polarity, 4)
+    
+    def score_batch(self, articles):
+        self.load()
+        keys = [self.article_key(article) for article in articles]
+        
+        with self.lock:
+            scores = {key: self.cache[key] for key in keys if key in self.cache}
+            for key in scores:
+                self.cache.move_to_end(key)
+            hits = sum(1 for key in keys if key in scores)
+            self.cache_hits += hits
+        metrics.inc('financegpt_cache_requests_total', hits, cache='sentiment', result='hit')
+        metrics.inc('financegpt_cache_requests_total', len(keys) - hits, cache='sentiment', result='miss')
+        
+        # Each distinct unseen headline is scored once, however often it repeats.
+        missing = {}
+        for key, article in zip(keys, articles):
+            if key not in scores and key not in missing:
+                missing[key] = f"{article.get('title') or ''}. {article.get('description') or ''}"
+        
+        if missing:
+            started = time.perf_counter()
+            fresh = {key: self.score_text(text) for key, text in missing.items()}
+            elapsed = time.perf_counter() - started
             
+            with self.lock:
+                self.cache.update(fresh)
+                while len(self.cache) > self.max_size:
+                    self.cache.popitem(last=False)
+                self.dirty = True
+                self.articles_scored += len(fresh)
+                self.scoring_seconds += elapsed
+            scores.update(fresh)
+            self.save()
+        
+        return [scores[key] for key in keys]
+    
+    def analyze(self, articles):
+        scores = self.score_batch(articles)
+        sentiment_score = float(np.mean(scores)) if scores else 0.0
+        
+        return {
+            'sentiment_score': round(sentiment_score, 4),
+            'label': 'positive' if sentiment_score > 0.05 else 'negative' if sentiment_score < -0.05 else 'neutral',
+            'positive': sum(1 for score in scores if score > 0.05),
+            'negative': sum(1 for score in scores if score < -0.05),
+            'neutral': sum(1 for score in scores if -0.05 <= score <= 0.05),
+            'article_scores': scores
+        }
+    
+    def record_symbol(self, symbol, score):
+        self.symbol_scores[symbol] = (score, time.time())
+    
+    def symbol_score(self, symbol):
+        entry = self.symbol_scores.get(symbol)
+        if entry is None or time.time() - entry[1] > self.symbol_max_age:
+            return None
+        return entry[0]
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.articles_scored + self.cache_hits
             return {
-                'symbol': symbol,
-                'current_price': round(current_price, 2),
-                'change_7d': round(change_7d, 2),
-                'change_30d': round(change_30d, 2)
+                'articles_scored': self.articles_scored,
+                'cache_hits': self.cache_hits,
+                'hit_ratio': round(self.cache_hits / lookups, 3) if lookups else None,
+                'articles_per_second': round(self.articles_scored / self.scoring_seconds, 1) if self.scoring_seconds else None,
+                'cache_size': len(self.cache) if self.cache is not None else 0,
+                'symbols_tracked': len(self.symbol_scores)
             }
-            
-        except Exception as e:
-            return None
+
+sentiment_engine = SentimentEngine(
+    os.getenv('SENTIMENT_CACHE_PATH', os.path.join(DATA_DIR, 'sentiment.json')),
+    max_size=int(os.getenv('SENTIMENT_CACHE_SIZE', '5000'))
+)
+
+def analyze_news_sentiment(articles):
+    return sentiment_engine.analyze(articles)
 
 class NewsAnalyzer:
     def __init__(self):
         self.news_api_key = os.getenv('NEWS_API_KEY')
+        self.news_api_url = os.getenv('NEWS_API_URL', "https://newsapi.org/v2/everything")
+        self.alpha_vantage_url = os.getenv('ALPHA_VANTAGE_URL', "https://www.alphavantage.co/query")
+        self.yahoo_rss_url = os.getenv('YAHOO_RSS_URL', "https://feeds.finance.yahoo.com/rss/2.0/headline")
+        self.registry = symbol_registry
+        self.single_flight = SingleFlight()
+        
+        # 'race' queries every provider concurrently, 'sequential' keeps the
+        # old one-after-another fallback.
+        self.governor = upstream_governor
+        self.fetch_mode = os.getenv('NEWS_FETCH_MODE', 'race')
+        self.providers = [
+            # (name, fetch, start delay in s, latency budget in s), in priority order
+            ('newsapi', self.try_news_api, 0.0, float(os.getenv('NEWSAPI_BUDGET', '6'))),
+            ('alpha_vantage', self.try_alpha_vantage_news, 0.3, float(os.getenv('ALPHA_VANTAGE_BUDGET', '5'))),
+            ('yahoo_rss', self.try_yahoo_rss, 0.6, float(os.getenv('YAHOO_RSS_BUDGET', '5')))
+        ]
+        self.executor = ThreadPoolExecutor(max_workers=4 * len(self.providers), thread_name_prefix='news')
     
     def get_stock_news(self, symbol):
+        with symbol_timer('news', symbol):
+            return self.single_flight.do(f"news:{symbol}", self.fetch_stock_news, symbol)
+    
+    def fetch_stock_news(self, symbol):
         try:
-            print(f"📰 Fetching news for {symbol}...")
+            logger.debug("📰 Fetching news for %s...", symbol)
             
             company_name = self.get_company_name(symbol)
             
-            articles = self.try_news_api(symbol, company_name)
-            if articles:
-                return articles
-            
-            articles = self.try_alpha_vantage_news(symbol, company_name)
-            if articles:
-                return articles
-            
-            articles = self.try_yahoo_rss(symbol, company_name)
+            if self.fetch_mode == 'race':
+                articles = self.race_providers(symbol, company_name)
+            else:
+                articles = self.try_providers_in_order(symbol, company_name)
             if articles:
                 return articles
             
@@ -397,132 +2937,905 @@ class NewsAnalyzer:
             return articles
             
         except Exception as e:
-            print(f"❌ News error: {e}")
+            logger.error(f"❌ News error: {e}")
             return self.get_sample_articles(symbol, self.get_company_name(symbol))
-
-    def try_news_api(self, symbol, company_name):
+    
+    def get_company_name(self, symbol):
+        return self.registry.get(symbol)['name']
+    
+    def get_sample_articles(self, symbol, company_name):
+        # No provider answered: a neutral, empty result rather than an error.
+        articles = self.build_news_result([])
+        articles['provider'] = None
+        return articles
+    
+    def tag_result(self, symbol, articles, provider, started):
+        sentiment_engine.record_symbol(symbol, articles['sentiment_score'])
+        articles['provider'] = provider
+        articles['latency_ms'] = round((time.monotonic() - started) * 1000)
+        logger.debug("🏁 %s news from %s in %dms", symbol, provider, articles['latency_ms'])
+        return articles
+    
+    def try_providers_in_order(self, symbol, company_name):
+        started = time.monotonic()
+        for name, fetch, _, budget in self.providers:
+            articles = fetch(symbol, company_name, timeout=budget)
+            if articles:
+                return self.tag_result(symbol, articles, name, started)
+        return None
+    
+    def race_providers(self, symbol, company_name):
+        started = time.monotonic()
+        finished = threading.Event()
+        
+        def run(fetch, delay, budget):
+            # Lower-priority providers hold back briefly and never start if
+            # a faster one has already answered.
+            if delay and finished.wait(delay):
+                return None
+            return fetch(symbol, company_name, timeout=budget)
+        
+        futures = {
+            self.executor.submit(run, fetch, delay, budget): priority
+            for priority, (_, fetch, delay, budget) in enumerate(self.providers)
+        }
+        deadline = started + max(delay + budget for _, _, delay, budget in self.providers)
+        pending = set(futures)
+        
         try:
-            url = f"https://newsapi.org/v2/everything"
-            params = {
-                'q': f'{company_name}',
-                'apiKey': self.news_api_key,
-                'language': 'en',
-                'sortBy': 'publishedAt',
-                'pageSize': 20,
-                'from': (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+            while pending:
+                done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    logger.warning(f"⏰ No news provider answered for {symbol} within budget")
+                    return None
+                
+                for future in sorted(done, key=futures.get):
+                    articles = future.result()
+                    if articles:
+                        return self.tag_result(symbol, articles, self.providers[futures[future]][0], started)
+            return None
+        finally:
+            finished.set()
+            for future in pending:
+                future.cancel()
+
+    def build_news_result(self, articles):
+        sentiment = analyze_news_sentiment(articles)
+        return {
+            'sentiment_score': sentiment['sentiment_score'],
+            'articles': articles,
+            'sentiment_analysis': sentiment
+        }
+    
+    def news_api_request(self, symbol, company_name):
+        return self.news_api_url, {
+            'q': f'{company_name}',
+            'apiKey': self.news_api_key,
+            'language': 'en',
+            'sortBy': 'publishedAt',
+            'pageSize': 20,
+            'from': (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        }
+    
+    def parse_news_api(self, news_data):
+        if news_data.get('status') != 'ok':
+            return None
+        
+        final_articles = []
+        for article in news_data.get('articles', [])[:10]:
+            title = article.get('title', '')
+            if title and title != '[Removed]':
+                final_articles.append(article)
+                if len(final_articles) >= 3:
+                    break
+        
+        if len(final_articles) > 0:
+            logger.debug("✅ News API: Found %d articles", len(final_articles))
+            return self.build_news_result(final_articles)
+        return None
+    
+    def alpha_vantage_request(self, symbol, company_name):
+        return self.alpha_vantage_url, {
+            'function': 'NEWS_SENTIMENT',
+            'tickers': symbol,
+            'apikey': "demo",
+            'limit': 10
+        }
+    
+    def parse_alpha_vantage(self, data):
+        if 'feed' not in data or len(data['feed']) == 0:
+            return None
+        
+        articles = []
+        for item in data['feed'][:3]:
+            article = {
+                'title': item.get('title', ''),
+                'description': item.get('summary', ''),
+                'url': item.get('url', ''),
+                'publishedAt': item.get('time_published', ''),
+                'source': {'name': item.get('source', 'Alpha Vantage')}
+            }
+            articles.append(article)
+        
+        logger.debug("✅ Alpha Vantage: Found %d articles", len(articles))
+        return self.build_news_result(articles)
+    
+    def yahoo_rss_request(self, symbol, company_name):
+        return self.yahoo_rss_url, {'s': symbol, 'region': 'US', 'lang': 'en-US'}
+    
+    def parse_yahoo_rss(self, content):
+        import feedparser
+        
+        feed = feedparser.parse(content)
+        if not feed.entries:
+            return None
+        
+        articles = []
+        for entry in feed.entries[:3]:
+            article = {
+                'title': entry.get('title', ''),
+                'description': entry.get('summary', ''),
+                'url': entry.get('link', ''),
+                'publishedAt': entry.get('published', ''),
+                'source': {'name': 'Yahoo Finance'}
             }
+            articles.append(article)
+        
+        logger.debug("✅ Yahoo RSS: Found %d articles", len(articles))
+        return self.build_news_result(articles)
+    
+    def try_news_api(self, symbol, company_name, timeout=15):
+        try:
+            url, params = self.news_api_request(symbol, company_name)
             
-            print(f"🔍 Trying News API for {symbol}...")
-            response = requests.get(url, params=params, timeout=15)
+            logger.debug("🔍 Trying News API for %s...", symbol)
+            response = self.governor.request('newsapi', requests.get, url, params=params, timeout=timeout)
             
             if response.status_code == 200:
-                news_data = response.json()
-                
-                if news_data.get('status') == 'ok':
-                    articles = news_data.get('articles', [])
-                    
-                    if len(articles) > 0:
-                        final_articles = []
-                        for article in articles[:10]:
-                            title = article.get('title', '')
-                            if title and title != '[Removed]':
-                                final_articles.append(article)
-                                if len(final_articles) >= 3:
-                                    break
-                        
-                        if len(final_articles) > 0:
-                            print(f"✅ News API: Found {len(final_articles)} articles")
-                            sentiment = analyze_news_sentiment(final_articles)
-                            
-                            return {
-                                'sentiment_score': sentiment['sentiment_score'],
-                                'articles': final_articles,
-                                'sentiment_analysis': sentiment
-                            }
-            
+                return self.parse_news_api(response.json())
             elif response.status_code == 429:
-                print(f"⏰ News API rate limited - trying alternatives...")
+                logger.debug("⏰ News API rate limited - trying alternatives...")
             
             return None
             
         except Exception as e:
-            print(f"❌ News API failed: {e}")
+            logger.warning(f"❌ News API failed: {e}")
             return None
         
-    def try_alpha_vantage_news(self, symbol, company_name):
+    def try_alpha_vantage_news(self, symbol, company_name, timeout=10):
         try:
-            api_key = "demo"
-            url = f"https://www.alphavantage.co/query"
-            params = {
-                'function': 'NEWS_SENTIMENT',
-                'tickers': symbol,
-                'apikey': api_key,
-                'limit': 10
-            }
+            url, params = self.alpha_vantage_request(symbol, company_name)
             
-            print(f"🔍 Trying Alpha Vantage for {symbol}...")
-            response = requests.get(url, params=params, timeout=10)
+            logger.debug("🔍 Trying Alpha Vantage for %s...", symbol)
+            response = self.governor.request('alpha_vantage', requests.get, url, params=params, timeout=timeout)
             
             if response.status_code == 200:
-                data = response.json()
-                
-                if 'feed' in data and len(data['feed']) > 0:
-                    articles = []
-                    for item in data['feed'][:3]:
-                        article = {
-                            'title': item.get('title', ''),
-                            'description': item.get('summary', ''),
-                            'url': item.get('url', ''),
-                            'publishedAt': item.get('time_published', ''),
-                            'source': {'name': item.get('source', 'Alpha Vantage')}
-                        }
-                        articles.append(article)
-                    
-                    print(f"✅ Alpha Vantage: Found {len(articles)} articles")
-                    sentiment = analyze_news_sentiment(articles)
-                    
-                    return {
-                        'sentiment_score': sentiment['sentiment_score'],
-                        'articles': articles,
-                        'sentiment_analysis': sentiment
-                    }
+                return self.parse_alpha_vantage(response.json())
                     
         except Exception as e:
-            print(f"❌ Alpha Vantage failed: {e}")
+            logger.warning(f"❌ Alpha Vantage failed: {e}")
         
         return None
     
-    def try_yahoo_rss(self, symbol, company_name):
+    def try_yahoo_rss(self, symbol, company_name, timeout=10):
         try:
-            import feedparser
-            
-            url = f"https://feeds.finance.yahoo.com/rss/2.0/headline?s={symbol}&region=US&lang=en-US"
-            
-            print(f"🔍 Trying Yahoo RSS for {symbol}...")
-            feed = feedparser.parse(url)
-            
-            if feed.entries and len(feed.entries) > 0:
-                articles = []
-                for entry in feed.entries[:3]:
-                    article = {
-                        'title': entry.get('title', ''),
-                        'description': entry.get('summary', ''),
-                        'url': entry.get('link', ''),
-                        'publishedAt': entry.get('published', ''),
-                        'source': {'name': 'Yahoo Finance'}
-                    }
-                    articles.append(article)
+            url, params = self.yahoo_rss_request(symbol, company_name)
+            
+            logger.debug("🔍 Trying Yahoo RSS for %s...", symbol)
+            # feedparser has no timeout of its own, so fetch the feed first.
+            response = self.governor.request('yahoo_rss', requests.get, url, params=params, timeout=timeout)
+            return self.parse_yahoo_rss(response.content)
                 
-                print(f"✅ Yahoo RSS: Found {len(articles)} articles")
-                sentiment = analyze_news_sentiment(articles)
+        except Exception as e:
+            logger.warning(f"❌ Yahoo RSS failed: {e}")
+        
+        return None
+
+market_collector = MarketDataCollector()
+simulated_feed = SimulatedFeed(
+    live_quotes, market_collector,
+    ticks_per_second=float(os.getenv('LIVE_FEED_TICKS_PER_SECOND', '50'))
+)
+
+class EncodedResponseCache:
+    # Encoded (and possibly gzipped) bodies per snapshot version, so every
+    # client polling the same version and `since` reuses one serialization.
+    def __init__(self, max_size=256, min_gzip_size=1024):
+        self.max_size = max_size
+        self.min_gzip_size = min_gzip_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.msgpack_available = importlib.util.find_spec('msgpack') is not None
+    
+    def negotiate(self, headers, requested_format=None):
+        accept = headers.get('accept') or ''
+        wants_msgpack = requested_format == 'msgpack' or 'application/msgpack' in accept or 'application/x-msgpack' in accept
+        content_format = 'msgpack' if wants_msgpack and self.msgpack_available else 'json'
+        use_gzip = 'gzip' in (headers.get('accept-encoding') or '')
+        return content_format, use_gzip
+    
+    def encode(self, payload, content_format, use_gzip):
+        if content_format == 'msgpack':
+            body = msgpack.packb(payload, use_bin_type=True)
+        else:
+            body = json.dumps(payload, separators=(',', ':'), default=str).encode()
+        if use_gzip and len(body) >= self.min_gzip_size:
+            return gzip.compress(body, compresslevel=5), True
+        return body, False
+    
+    def get(self, key, build_payload, content_format, use_gzip):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            metrics.inc('financegpt_cache_requests_total', cache='response', result='hit')
+            return entry
+        
+        metrics.inc('financegpt_cache_requests_total', cache='response', result='miss')
+        entry = self.encode(build_payload(), content_format, use_gzip)
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return entry
+
+response_cache = EncodedResponseCache(max_size=int(os.getenv('RESPONSE_CACHE_SIZE', '256')))
+
+def render_market_snapshot(snapshot, args, headers):
+    # Shared by the Flask and ASGI routes. `headers` must answer lower-case
+    # names. Returns (status, response headers, body).
+    asset_type, version, epoch, live = snapshot['asset_type'], snapshot['version'], snapshot['epoch'], snapshot['live']
+    # Live ticks change the body without a new snapshot version.
+    etag = f'W/"{epoch}-{version}-{live}"' if live else f'W/"{epoch}-{version}"'
+    response_headers = {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept, Accept-Encoding',
+        'X-Snapshot-Version': str(version),
+        'X-Snapshot-Epoch': epoch
+    }
+    if snapshot['age'] is not None:
+        response_headers['Age'] = str(int(snapshot['age']))
+    
+    if etag in [tag.strip() for tag in (headers.get('if-none-match') or '').split(',')]:
+        return 304, response_headers, b''
+    
+    # A `since` from another epoch (or from the future) cannot be trusted:
+    # answer with the full snapshot instead.
+    since = None
+    if args.get('since') is not None and args.get('epoch', epoch) == epoch:
+        try:
+            since = int(args.get('since'))
+        except ValueError:
+            since = None
+        if since is not None and not 0 <= since <= version:
+            since = None
+    
+    content_format, use_gzip = response_cache.negotiate(headers, args.get('format'))
+    
+    def build_payload():
+        if since is not None:
+            payload = market_collector.get_delta(asset_type, since)
+            payload['stale'] = snapshot['stale']
+            return payload
+        # Age lives in the Age header so the body stays cacheable per version.
+        return {key: value for key, value in snapshot.items() if key != 'age'}
+    
+    key = (asset_type, epoch, version, live, since, snapshot['stale'], content_format, use_gzip)
+    body, gzipped = response_cache.get(key, build_payload, content_format, use_gzip)
+    response_headers['Content-Type'] = 'application/msgpack' if content_format == 'msgpack' else 'application/json'
+    if gzipped:
+        response_headers['Content-Encoding'] = 'gzip'
+    return 200, response_headers, body
+
+@app.route('/api/market/<asset_type>')
+def market_snapshot(asset_type):
+    # ?since=<version>&epoch=<epoch> returns only the symbols that changed;
+    # If-None-Match with the last ETag returns 304 while nothing did.
+    if asset_type not in market_collector.refresh_intervals:
+        return jsonify({'error': f'Unknown asset type: {asset_type}'}), 404
+    headers = {name.lower(): value for name, value in request.headers.items()}
+    status, response_headers, body = render_market_snapshot(market_collector.get_snapshot(asset_type), request.args, headers)
+    return Response(body, status=status, headers=response_headers)
+
+@app.route('/api/market/<asset_type>/stream')
+def market_stream(asset_type):
+    if asset_type not in market_collector.refresh_intervals:
+        return jsonify({'error': f'Unknown asset type: {asset_type}'}), 404
+    
+    # Server-Sent Events for EventSource clients, NDJSON for everything else.
+    use_sse = 'text/event-stream' in request.headers.get('Accept', '')
+    
+    def generate():
+        for event in market_collector.stream_market_data(asset_type):
+            if use_sse:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            else:
+                yield json.dumps(event) + '\n'
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def parse_universe_query(args):
+    # Shared by the Flask and ASGI routes; raises ValueError on bad input.
+    asset_type = args.get('asset_type') or None
+    if asset_type and asset_type not in market_collector.refresh_intervals:
+        raise ValueError(f"Unknown asset type: {asset_type}")
+    
+    sort = args.get('sort', 'market_cap')
+    if sort not in MarketIndex.sort_fields and sort != 'movers':
+        raise ValueError(f"Unknown sort key: {sort}")
+    order = args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    direction = args.get('direction') or None
+    if direction not in (None, 'gainers', 'losers'):
+        raise ValueError("direction must be gainers or losers")
+    
+    page = int(args.get('page', 1))
+    page_size = min(int(args.get('page_size', 50)), 500)
+    if page < 1 or page_size < 1:
+        raise ValueError("page and page_size must be positive")
+    
+    min_market_cap = args.get('min_market_cap')
+    max_market_cap = args.get('max_market_cap')
+    return {
+        'asset_type': asset_type,
+        'sort': sort,
+        'order': order,
+        'direction': direction,
+        'search': args.get('q') or None,
+        'min_market_cap': float(min_market_cap) if min_market_cap else None,
+        'max_market_cap': float(max_market_cap) if max_market_cap else None,
+        'page': page,
+        'page_size': page_size
+    }
+
+@app.route('/api/universe')
+def universe_query():
+    # e.g. /api/universe?asset_type=stocks&sort=movers&direction=losers&min_market_cap=1e10&page=2
+    try:
+        query = parse_universe_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(market_collector.query(**query))
+
+def parse_quote_symbols(args):
+    return [s.strip().upper() for s in args.get('symbols', '').split(',') if s.strip()]
+
+def build_ohlc(symbol, args):
+    # Shared by the Flask and ASGI routes; raises ValueError on bad input.
+    interval = int(args.get('interval', 60))
+    window = int(args.get('window', 0)) or None
+    if interval < 1 or (window is not None and window < 0):
+        raise ValueError("interval and window must be positive")
+    bars = live_quotes.ohlc(symbol, interval, window)
+    if bars is None:
+        return None
+    return {
+        'symbol': symbol,
+        'interval': interval,
+        'bars': [
+            {'ts': int(bar['ts']), 'open': float(bar['open']), 'high': float(bar['high']),
+             'low': float(bar['low']), 'close': float(bar['close']), 'volume': float(bar['volume'])}
+            for bar in bars
+        ]
+    }
+
+def format_tick_events(events):
+    return ''.join(f"event: tick\ndata: {json.dumps(event)}\n\n" for event in events)
+
+@app.route('/api/quotes')
+def quotes():
+    symbols = parse_quote_symbols(request.args)
+    if not symbols:
+        return jsonify({'error': 'No symbols given'}), 400
+    return jsonify({'quotes': live_quotes.quotes(symbols)})
+
+@app.route('/api/quotes/<symbol>/ohlc')
+def quote_ohlc(symbol):
+    # e.g. /api/quotes/AAPL/ohlc?interval=60&window=3600
+    try:
+        payload = build_ohlc(symbol.upper(), request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if payload is None:
+        return jsonify({'error': f'No ticks for {symbol.upper()}'}), 404
+    return jsonify(payload)
+
+@app.route('/api/quotes/stream')
+def quote_stream():
+    # Server-Sent Events; without ?symbols= every tick is pushed.
+    subscription = live_quotes.subscribe(parse_quote_symbols(request.args) or None)
+    
+    def generate():
+        try:
+            while True:
+                events = subscription.get(timeout=15)
+                # A comment line keeps proxies from closing an idle stream.
+                yield format_tick_events(events) if events else ': keep-alive\n\n'
+        finally:
+            subscription.close()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+groq_predictor = GroqStockPredictor()
+
+def prediction_symbols(args):
+    # ?symbols=A,B or ?asset_type=stocks to sweep a whole universe.
+    asset_type = args.get('asset_type')
+    if asset_type:
+        return symbol_universe.symbols(asset_type)
+    return [s.strip().upper() for s in args.get('symbols', '').split(',') if s.strip()]
+
+@app.route('/api/predictions')
+def predictions():
+    symbols = prediction_symbols(request.args)
+    if not symbols:
+        return jsonify({'error': 'No symbols given'}), 400
+    
+    def generate():
+        for symbol, prediction in groq_predictor.predict_many(symbols):
+            yield json.dumps({'symbol': symbol, 'prediction': prediction}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+news_analyzer = NewsAnalyzer()
+
+def collect_stats():
+    return {
+        'cache_backend': cache_backend.name,
+        'upstreams': upstream_governor.snapshot(),
+        'single_flight': {
+            'market': market_collector.single_flight.stats(),
+            'predictions': groq_predictor.single_flight.stats(),
+            'news': news_analyzer.single_flight.stats()
+        },
+        'sentiment': sentiment_engine.stats(),
+        'prescreen': groq_predictor.screener.stats(),
+        'live_quotes': live_quotes.stats(),
+        'startup': STARTUP
+    }
+
+@app.route('/api/stats')
+def stats():
+    return jsonify(collect_stats())
+
+def collect_gauges():
+    breaker_states = {'closed': 0, 'half_open': 1, 'open': 2}
+    gauges = []
+    for provider, upstream in upstream_governor.snapshot().items():
+        gauges.append(('financegpt_upstream_breaker_state', {'provider': provider},
+                       breaker_states.get(upstream['breaker']['state'], -1), 'Circuit breaker state (0 closed, 1 half-open, 2 open)'))
+        gauges.append(('financegpt_upstream_rate', {'provider': provider},
+                       upstream['limiter']['rate'], 'Current token bucket rate in requests per second'))
+    for asset_type in market_collector.refresh_intervals:
+        age = market_collector.get_cache_age(asset_type)
+        if age is not None:
+            gauges.append(('financegpt_market_snapshot_age_seconds', {'asset_type': asset_type},
+                           round(age, 3), 'Age of the served market snapshot'))
+    gauges.append(('financegpt_prediction_cache_entries', {}, len(groq_predictor.prediction_cache), 'Cached predictions'))
+    gauges.append(('financegpt_sentiment_cache_entries', {}, sentiment_engine.stats()['cache_size'], 'Cached sentiment scores'))
+    live = live_quotes.stats()
+    gauges.append(('financegpt_live_symbols', {}, live['symbols'], 'Symbols with a tick buffer'))
+    gauges.append(('financegpt_live_buffer_bytes', {}, live['memory_bytes'], 'Memory held by tick buffers'))
+    gauges.append(('financegpt_live_subscribers', {}, live['subscribers'], 'Connected live quote subscribers'))
+    gauges.append(('financegpt_live_ticks_total', {}, live['published'], 'Ticks published since start'))
+    gauges.append(('financegpt_live_dropped_total', {}, live['dropped'], 'Ticks dropped for slow subscribers'))
+    return gauges
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(collect_gauges()), mimetype='text/plain; version=0.0.4')
+
+class AsyncSingleFlight:
+    # Same contract as SingleFlight, for coroutines on one event loop.
+    def __init__(self):
+        self.tasks = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    async def do(self, key, fn, *args):
+        task = self.tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self.tasks[key] = task
+            task.add_done_callback(lambda _: self.tasks.pop(key, None))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    def stats(self):
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self.tasks)
+        }
+
+class AsyncUpstreams:
+    def __init__(self, governor=None):
+        self.governor = governor or upstream_governor
+        self.client = None
+        self.semaphores = {}
+    
+    def semaphore(self, provider):
+        if provider not in self.semaphores:
+            prefix = self.governor.limits.get(provider, (provider.upper(),))[0]
+            self.semaphores[provider] = asyncio.Semaphore(int(os.getenv(f'{prefix}_ASYNC_CONCURRENCY', '16')))
+        return self.semaphores[provider]
+    
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+            )
+    
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+    
+    async def request(self, provider, method, url, **kwargs):
+        await self.start()
+        async with self.semaphore(provider):
+            return await self.governor.request_async(provider, getattr(self.client, method), url, **kwargs)
+    
+    async def run_blocking(self, provider, fn, *args):
+        # yfinance has no async API, so it runs on a worker thread under the
+        # same per-upstream concurrency cap.
+        async with self.semaphore(provider):
+            return await asyncio.to_thread(fn, *args)
+
+class AsyncMarketDataCollector:
+    def __init__(self, collector, upstreams):
+        self.collector = collector
+        self.upstreams = upstreams
+        self.single_flight = AsyncSingleFlight()
+    
+    async def read_cache(self, fn, *args):
+        # A shared backend means blocking SQLite or socket I/O, so those reads
+        # go to a worker thread; the in-process backend is read inline.
+        if self.collector.cache_backend.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+    
+    async def get_snapshot(self, asset_type):
+        data, _ = await self.read_cache(self.collector.get_cache_entry, asset_type)
+        if data:
+            # Warm path never touches the network; stale snapshots are
+            # revalidated by the collector's background refresher.
+            return await self.read_cache(self.collector.get_snapshot, asset_type)
+        return await self.single_flight.do(
+            f"market:{asset_type}", self.upstreams.run_blocking,
+            'yfinance', self.collector.get_snapshot, asset_type
+        )
+
+class AsyncGroqStockPredictor:
+    def __init__(self, predictor, upstreams):
+        self.predictor = predictor
+        self.upstreams = upstreams
+        self.single_flight = AsyncSingleFlight()
+    
+    async def get_ai_prediction(self, symbol, context=None):
+        with symbol_timer('prediction', symbol):
+            return await self.single_flight.do(f"prediction:{symbol}", self.fetch_ai_prediction, symbol, context)
+    
+    async def fetch_ai_prediction(self, symbol, context=None):
+        predictor = self.predictor
+        try:
+            context = context or await self.upstreams.run_blocking('yfinance', predictor.get_stock_context, symbol)
+            if not context:
+                return None
+            
+            # May read the cache file or a shared backend.
+            cached_pred = await asyncio.to_thread(predictor.prediction_cache.get, context)
+            if cached_pred:
+                return cached_pred
+            
+            data = predictor.build_request(symbol, context)
+            headers = {"Authorization": f"Bearer {predictor.api_key}"}
+            timeout = httpx.Timeout(predictor.timeout[1], connect=predictor.timeout[0])
+            
+            max_retries = 3
+            for attempt in range(max_retries):
+                if attempt:
+                    metrics.inc('financegpt_upstream_retries_total', provider='groq')
+                try:
+                    response = await self.upstreams.request(
+                        'groq', 'post', predictor.api_url, json=data, headers=headers, timeout=timeout
+                    )
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    logger.debug("⏰ Groq request for %s failed on attempt %d/%d: %s", symbol, attempt + 1, max_retries, e)
+                    if attempt == max_retries - 1:
+                        return None
+                    await asyncio.sleep(predictor.governor.backoff(attempt, cap=predictor.max_retry_wait))
+                    continue
                 
-                return {
-                    'sentiment_score': sentiment['sentiment_score'],
-                    'articles': articles,
-                    'sentiment_analysis': sentiment
-                }
+                if response.status_code == 200:
+                    prediction = predictor.parse_response(symbol, context, response.json())
+                    if prediction:
+                        await asyncio.to_thread(predictor.prediction_cache.put, context, prediction)
+                        return prediction
+                elif response.status_code != 429:
+                    logger.warning(f"❌ Groq API Error: {response.status_code}")
                 
+                if attempt == max_retries - 1:
+                    return None
+            return None
+        
+        except Exception as e:
+            logger.error(f"❌ Groq prediction error: {e}")
+            return None
+    
+    async def predict_many(self, symbols):
+        if self.predictor.screener.enabled:
+            ready, escalate = await self.upstreams.run_blocking('yfinance', self.predictor.screen, symbols)
+            for item in ready.items():
+                yield item
+        else:
+            escalate = {symbol: (None, None) for symbol in dict.fromkeys(symbols)}
+        
+        async def run(symbol, context, baseline):
+            return symbol, await self.get_ai_prediction(symbol, context) or baseline
+        
+        tasks = [asyncio.ensure_future(run(symbol, *escalate[symbol])) for symbol in escalate]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+class AsyncNewsAnalyzer:
+    def __init__(self, news, upstreams):
+        self.news = news
+        self.upstreams = upstreams
+        self.single_flight = AsyncSingleFlight()
+        # provider: (request builder, parser, whether the parser wants JSON)
+        self.handlers = {
+            'newsapi': (news.news_api_request, news.parse_news_api, True),
+            'alpha_vantage': (news.alpha_vantage_request, news.parse_alpha_vantage, True),
+            'yahoo_rss': (news.yahoo_rss_request, news.parse_yahoo_rss, False)
+        }
+    
+    async def get_stock_news(self, symbol):
+        with symbol_timer('news', symbol):
+            return await self.single_flight.do(f"news:{symbol}", self.fetch_stock_news, symbol)
+    
+    async def fetch_provider(self, name, symbol, company_name, delay, budget):
+        if delay:
+            await asyncio.sleep(delay)
+        
+        build_request, parse, wants_json = self.handlers[name]
+        url, params = build_request(symbol, company_name)
+        try:
+            response = await self.upstreams.request(name, 'get', url, params=params, timeout=budget)
+            if response.status_code != 200:
+                return None
+            payload = response.json() if wants_json else response.content
+            # Parsing includes sentiment scoring, which is CPU work.
+            return await asyncio.to_thread(parse, payload)
         except Exception as e:
-            print(f"❌ Yahoo RSS failed: {e}")
+            logger.warning(f"❌ {name} failed for {symbol}: {e}")
+            return None
+    
+    async def fetch_stock_news(self, symbol):
+        company_name = self.news.get_company_name(symbol)
+        started = time.monotonic()
+        
+        tasks = {
+            asyncio.ensure_future(self.fetch_provider(name, symbol, company_name, delay, budget)): priority
+            for priority, (name, _, delay, budget) in enumerate(self.news.providers)
+        }
+        deadline = started + max(delay + budget for _, _, delay, budget in self.news.providers)
+        pending = set(tasks)
+        
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in sorted(done, key=tasks.get):
+                    articles = task.result()
+                    if articles:
+                        return self.news.tag_result(symbol, articles, self.news.providers[tasks[task]][0], started)
+        finally:
+            # Unlike the threaded race, losing requests are actually cancelled.
+            for task in pending:
+                task.cancel()
         
-        return None
\ No newline at end of file
+        return await asyncio.to_thread(self.news.get_sample_articles, symbol, company_name)
+
+class AsyncService:
+    # Minimal ASGI application for the async service mode:
+    #   uvicorn app:asgi_app
+    def __init__(self, collector, predictor, news):
+        self.upstreams = AsyncUpstreams()
+        self.market = AsyncMarketDataCollector(collector, self.upstreams)
+        self.predictor = AsyncGroqStockPredictor(predictor, self.upstreams)
+        self.news = AsyncNewsAnalyzer(news, self.upstreams)
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle(scope, send, receive)
+    
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.upstreams.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.upstreams.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def handle(self, scope, send, receive=None):
+        parts = [part for part in scope['path'].split('/') if part]
+        query = parse_qs(scope.get('query_string', b'').decode())
+        
+        if scope['method'] == 'GET' and parts == ['metrics']:
+            # The gauges read snapshot ages from the cache backend.
+            body = metrics.render(await asyncio.to_thread(collect_gauges)).encode()
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/plain; version=0.0.4'), (b'content-length', str(len(body)).encode())]
+            })
+            return await send({'type': 'http.response.body', 'body': body})
+        
+        if scope['method'] != 'GET' or parts[:1] != ['api']:
+            return await self.send_json(send, {'error': 'Not found'}, 404)
+        
+        if len(parts) == 3 and parts[1] == 'market' and parts[2] in self.market.collector.refresh_intervals:
+            snapshot = await self.market.get_snapshot(parts[2])
+            headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+            args = {key: values[0] for key, values in query.items()}
+            status, response_headers, body = await asyncio.to_thread(render_market_snapshot, snapshot, args, headers)
+            return await self.send_body(send, status, response_headers, body)
+        
+        if parts == ['api', 'universe']:
+            try:
+                universe_query = parse_universe_query({key: values[0] for key, values in query.items()})
+            except ValueError as e:
+                return await self.send_json(send, {'error': str(e)}, 400)
+            # Index lookups are in-memory and cheap, but a rebuild after a
+            # refresh is not, so keep it off the event loop.
+            return await self.send_json(send, await asyncio.to_thread(self.market.collector.query, **universe_query))
+        
+        if parts == ['api', 'quotes']:
+            symbols = parse_quote_symbols({key: values[0] for key, values in query.items()})
+            if not symbols:
+                return await self.send_json(send, {'error': 'No symbols given'}, 400)
+            return await self.send_json(send, {'quotes': live_quotes.quotes(symbols)})
+        
+        if parts == ['api', 'quotes', 'stream']:
+            return await self.send_ticks(send, receive, parse_quote_symbols({key: values[0] for key, values in query.items()}))
+        
+        if len(parts) == 4 and parts[1] == 'quotes' and parts[3] == 'ohlc':
+            try:
+                payload = build_ohlc(parts[2].upper(), {key: values[0] for key, values in query.items()})
+            except ValueError as e:
+                return await self.send_json(send, {'error': str(e)}, 400)
+            if payload is None:
+                return await self.send_json(send, {'error': f'No ticks for {parts[2].upper()}'}, 404)
+            return await self.send_json(send, payload)
+        
+        if len(parts) == 3 and parts[1] == 'news':
+            return await self.send_json(send, await self.news.get_stock_news(parts[2].upper()))
+        
+        if parts == ['api', 'predictions']:
+            symbols = prediction_symbols({key: values[0] for key, values in query.items()})
+            if not symbols:
+                return await self.send_json(send, {'error': 'No symbols given'}, 400)
+            return await self.send_stream(send, self.predictor.predict_many(symbols))
+        
+        if parts == ['api', 'stats']:
+            payload = await asyncio.to_thread(collect_stats)
+            payload['async'] = {
+                'market': self.market.single_flight.stats(),
+                'predictions': self.predictor.single_flight.stats(),
+                'news': self.news.single_flight.stats()
+            }
+            return await self.send_json(send, payload)
+        
+        return await self.send_json(send, {'error': 'Not found'}, 404)
+    
+    async def send_body(self, send, status, headers, body):
+        headers = {**headers, 'Content-Length': str(len(body))}
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+    
+    async def send_json(self, send, payload, status=200):
+        body = json.dumps(payload, default=str).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+    
+    async def send_stream(self, send, results):
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'application/x-ndjson')]
+        })
+        async for symbol, prediction in results:
+            line = json.dumps({'symbol': symbol, 'prediction': prediction}, default=str) + '\n'
+            await send({'type': 'http.response.body', 'body': line.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    
+    async def send_ticks(self, send, receive, symbols):
+        loop = asyncio.get_running_loop()
+        subscription = live_quotes.subscribe(symbols or None, loop=loop)
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive)) if receive else loop.create_future()
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')]
+            })
+            while not disconnected.done():
+                events = await subscription.get_async(timeout=15)
+                body = format_tick_events(events) if events else ': keep-alive\n\n'
+                await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+        finally:
+            disconnected.cancel()
+            subscription.close()
+    
+    async def wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+asgi_app = AsyncService(market_collector, groq_predictor, news_analyzer)
+
+def warm_up(download=False):
+    # Optional: pay the first-use costs up front instead of on a live request.
+    started = time.perf_counter()
+    ensure_vader_lexicon(allow_download=download)
+    yf._load()
+    sentiment_engine.get_analyzer()
+    sentiment_engine.load()
+    symbol_registry.load()
+    groq_predictor.prediction_cache.load()
+    STARTUP['warm_up_seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"🔥 Warm-up finished in {STARTUP['warm_up_seconds']}s")
+
+def flush_caches():
+    # The file-backed caches throttle their writes; keep what is unsaved.
+    sentiment_engine.save(force=True)
+    groq_predictor.prediction_cache.save(force=True)
+
+atexit.register(flush_caches)
+
+@app.cli.command('warm-up')
+def warm_up_command():
+    warm_up(download=True)
+
+if os.getenv('WARM_UP_ON_START', '0') == '1':
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+if os.getenv('LIVE_FEED') == 'simulated':
+    simulated_feed.start()
+
+STARTUP['import_seconds'] = round(time.perf_counter() - IMPORT_STARTED, 3)
@@ -0,0 +1,564 @@
+"""Offline benchmarks for the market, prediction and news paths.
+
+Everything upstream is replayed from benchmarks/fixtures: yfinance through an
+in-process replay adapter, Groq/NewsAPI/Alpha Vantage/Yahoo RSS through a local
+stub server that app.py is pointed at via its *_URL settings. Nothing touches
+the network, so the numbers are comparable from one run (and box) to the next.
+
+    python benchmark.py                               # fixtures only, no added latency
+    python benchmark.py --profile typical             # realistic upstream latency
+    python benchmark.py --profile degraded            # slow upstreams that also 429
+    python benchmark.py --latency groq=0.8 --rate-limit newsapi=0.3
+    python benchmark.py --json run.json --baseline benchmarks/baseline.json
+    python benchmark.py fixtures                      # regenerate the synthetic fixtures
+    python benchmark.py record                        # re-record fixtures from live APIs
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'fixtures')
+
+# provider: (seconds of latency per call, fraction of calls answered with 429)
+PROFILES = {
+    'none': {},
+    'typical': {
+        'yfinance': (0.35, 0.0),
+        'groq': (0.6, 0.0),
+        'newsapi': (0.25, 0.0),
+        'alpha_vantage': (0.5, 0.0),
+        'yahoo_rss': (0.15, 0.0)
+    },
+    'degraded': {
+        'yfinance': (1.2, 0.05),
+        'groq': (2.0, 0.2),
+        'newsapi': (1.5, 0.5),
+        'alpha_vantage': (2.5, 0.3),
+        'yahoo_rss': (0.6, 0.1)
+    }
+}
+
+class UpstreamProfile:
+    def __init__(self, settings, seed=0):
+        self.settings = settings
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.rate_limited = {}
+
+    def simulate(self, provider):
+        # Returns True when this call should be answered with a 429.
+        latency, rate_limit = self.settings.get(provider, (0.0, 0.0))
+        with self.lock:
+            jitter = self.random.uniform(0.75, 1.25)
+            limited = self.random.random() < rate_limit
+            self.calls[provider] = self.calls.get(provider, 0) + 1
+            if limited:
+                self.rate_limited[provider] = self.rate_limited.get(provider, 0) + 1
+        if latency:
+            time.sleep(latency * jitter)
+        return limited
+
+    def reset_counts(self):
+        with self.lock:
+            counts = {'calls': dict(self.calls), 'rate_limited': dict(self.rate_limited)}
+            self.calls.clear()
+            self.rate_limited.clear()
+        return counts
+
+def load_fixture(name):
+    path = os.path.join(FIXTURES_DIR, name)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f) if name.endswith('.json') else f.read()
+
+class FixtureServer:
+    # Serves the recorded HTTP payloads. {query} in a fixture is replaced with
+    # the symbol or company the client asked about, so every symbol gets its
+    # own headlines (and its own sentiment cache entries).
+    routes = {
+        '/groq': ('groq', 'groq.json', None),
+        '/newsapi': ('newsapi', 'newsapi.json', 'q'),
+        '/alpha_vantage': ('alpha_vantage', 'alpha_vantage.json', 'tickers'),
+        '/yahoo_rss': ('yahoo_rss', 'yahoo_rss.xml', 's')
+    }
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.payloads = {}
+        for path, (_, fixture, _) in self.routes.items():
+            payload = load_fixture(fixture)
+            self.payloads[path] = json.dumps(payload) if fixture.endswith('.json') else payload
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fixture-server', daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, handler):
+        parsed = urlparse(handler.path)
+        route = self.routes.get(parsed.path)
+        if route is None:
+            return self.respond(handler, 404, b'{}', 'application/json')
+
+        provider, fixture, query_param = route
+        if self.profile.simulate(provider):
+            return self.respond(handler, 429, b'{"status": "error", "code": "rateLimited"}', 'application/json', {'Retry-After': '1'})
+
+        body = self.payloads[parsed.path]
+        if query_param:
+            query = parse_qs(parsed.query).get(query_param, [''])[0]
+            body = body.replace('{query}', query)
+        content_type = 'application/rss+xml' if fixture.endswith('.xml') else 'application/json'
+        self.respond(handler, 200, body.encode('utf-8'), content_type)
+
+    def respond(self, handler, status, body, content_type, headers=None):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+class ReplayTicker:
+    def __init__(self, replay, symbol):
+        self.replay = replay
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        self.replay.simulate()
+        return dict(self.replay.infos.get(self.symbol, {}))
+
+class ReplayYFinance:
+    # Stands in for the yfinance module: download() and Ticker().info answer
+    # from the recorded histories, shifted so the newest bar lands on today.
+    def __init__(self, histories, infos, profile):
+        import pandas as pd
+        self.pd = pd
+        self.infos = infos
+        self.profile = profile
+
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        newest = max(bars[-1][0] for bars in histories.values())
+        offset = int(today - newest)
+        self.frames = {}
+        for symbol, bars in histories.items():
+            index = pd.to_datetime([bar[0] + offset for bar in bars], unit='s', utc=True)
+            self.frames[symbol] = pd.DataFrame(
+                [bar[1:] for bar in bars], index=index, columns=['Open', 'High', 'Low', 'Close', 'Volume']
+            )
+
+    def simulate(self):
+        if self.profile.simulate('yfinance'):
+            raise Exception("429 Client Error: Too Many Requests")
+
+    def download(self, tickers, period=None, start=None, **kwargs):
+        self.simulate()
+        symbols = tickers.split() if isinstance(tickers, str) else list(tickers)
+
+        cutoff = None
+        if start is not None:
+            cutoff = self.pd.Timestamp(start, tz='UTC')
+        elif period and period.endswith('mo'):
+            cutoff = self.pd.Timestamp.now(tz='UTC') - self.pd.Timedelta(days=31 * int(period[:-2]))
+        elif period and period.endswith('d'):
+            cutoff = self.pd.Timestamp.now(tz='UTC') - self.pd.Timedelta(days=int(period[:-1]))
+
+        frames = {}
+        for symbol in symbols:
+            frame = self.frames.get(symbol)
+            if frame is None:
+                continue
+            frames[symbol] = frame[frame.index >= cutoff] if cutoff is not None else frame
+        if not frames:
+            return self.pd.DataFrame()
+        return self.pd.concat(frames, axis=1)
+
+    def Ticker(self, symbol):
+        return ReplayTicker(self, symbol)
+
+def parse_overrides(values):
+    overrides = {}
+    for value in values or ():
+        provider, _, number = value.partition('=')
+        overrides[provider.strip()] = float(number)
+    return overrides
+
+def build_profile(args):
+    settings = {provider: tuple(values) for provider, values in PROFILES[args.profile].items()}
+    for provider, latency in parse_overrides(args.latency).items():
+        settings[provider] = (latency, settings.get(provider, (0.0, 0.0))[1])
+    for provider, rate_limit in parse_overrides(args.rate_limit).items():
+        settings[provider] = (settings.get(provider, (0.0, 0.0))[0], rate_limit)
+    return UpstreamProfile(settings, seed=args.seed)
+
+def configure_environment(args, data_dir, server_url):
+    os.environ.update({
+        'DATA_DIR': data_dir,
+        'CACHE_BACKEND': 'memory',
+        'LOG_LEVEL': args.log_level,
+        'WARM_UP_ON_START': '0',
+        'NLTK_ALLOW_DOWNLOAD': '0',
+        'GROQ_API_URL': f"{server_url}/groq",
+        'GROQ_API_KEY': 'benchmark',
+        'NEWS_API_URL': f"{server_url}/newsapi",
+        'NEWS_API_KEY': 'benchmark',
+        'ALPHA_VANTAGE_URL': f"{server_url}/alpha_vantage",
+        'YAHOO_RSS_URL': f"{server_url}/yahoo_rss"
+    })
+    if not args.real_limits:
+        # Measure our own code, not the production request budgets.
+        for prefix in ('YF', 'GROQ', 'NEWSAPI', 'ALPHA_VANTAGE', 'YAHOO_RSS'):
+            os.environ[f'{prefix}_REQUESTS_PER_SECOND'] = '10000'
+            os.environ[f'{prefix}_BURST'] = '10000'
+            os.environ[f'{prefix}_FAILURE_THRESHOLD'] = '1000000'
+
+class Components:
+    # Each component builds fresh objects on an empty directory (cold), then
+    # runs the same workload again on the objects it just filled (warm).
+    def __init__(self, financegpt, symbols, concurrency):
+        self.app = financegpt
+        self.symbols = symbols
+        self.concurrency = concurrency
+
+    def market_setup(self, data_dir):
+        app = self.app
+        store = app.PriceStore(os.path.join(data_dir, 'prices'))
+        registry = app.SymbolRegistry(os.path.join(data_dir, 'symbols.json'))
+        return app.MarketDataCollector(
+            store=store, registry=registry, analytics=app.MarketAnalytics(store), backend=app.MemoryCacheBackend()
+        )
+
+    def market_run(self, collector):
+        loaded = 0
+        for asset_type in collector.refresh_intervals:
+            for event in collector.iter_and_cache(asset_type):
+                if event['type'] == 'summary':
+                    loaded += event['loaded']
+        return loaded
+
+    def predictions_setup(self, data_dir):
+        app = self.app
+        store = app.PriceStore(os.path.join(data_dir, 'prices'))
+        predictor = app.GroqStockPredictor(store=store, analytics=app.MarketAnalytics(store))
+        predictor.prediction_cache = app.PredictionCache(os.path.join(data_dir, 'predictions.json'))
+        return predictor
+
+    def predictions_run(self, predictor):
+        return sum(1 for _, prediction in predictor.predict_many(self.symbols) if prediction)
+
+    def news_setup(self, data_dir):
+        app = self.app
+        # analyze_news_sentiment() goes through the module-level engine.
+        app.sentiment_engine = app.SentimentEngine(os.path.join(data_dir, 'sentiment.json'))
+        return app.NewsAnalyzer()
+
+    def news_run(self, analyzer):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = list(executor.map(analyzer.get_stock_news, self.symbols))
+        return sum(1 for result in results if result and result.get('articles'))
+
+    def all(self):
+        return {
+            'market': (self.market_setup, self.market_run),
+            'predictions': (self.predictions_setup, self.predictions_run),
+            'news': (self.news_setup, self.news_run)
+        }
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+def run_component(name, setup, run, profile, repeat, measure_memory):
+    cold, warm = [], []
+    items = 0
+    for _ in range(repeat):
+        data_dir = tempfile.mkdtemp(prefix=f'financegpt-bench-{name}-')
+        try:
+            state = setup(data_dir)
+            profile.reset_counts()
+            seconds, items = timed(run, state)
+            cold.append(seconds)
+            cold_upstream = profile.reset_counts()
+            seconds, _ = timed(run, state)
+            warm.append(seconds)
+            warm_upstream = profile.reset_counts()
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    result = {
+        'items': items,
+        'cold_seconds': round(statistics.median(cold), 4),
+        'warm_seconds': round(statistics.median(warm), 4),
+        'cold_items_per_second': round(items / statistics.median(cold), 1) if items else 0.0,
+        'warm_items_per_second': round(items / statistics.median(warm), 1) if items else 0.0,
+        'upstream_cold': cold_upstream,
+        'upstream_warm': warm_upstream
+    }
+
+    if measure_memory:
+        # Separate pass: tracemalloc slows allocation-heavy code down too much
+        # to share a run with the latency numbers.
+        data_dir = tempfile.mkdtemp(prefix=f'financegpt-bench-{name}-')
+        try:
+            tracemalloc.start()
+            state = setup(data_dir)
+            run(state)
+            run(state)
+            result['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        finally:
+            tracemalloc.stop()
+            shutil.rmtree(data_dir, ignore_errors=True)
+        profile.reset_counts()
+
+    return result
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('components', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('cold_seconds', 'warm_seconds', 'peak_memory_mb'):
+            if metric in result and previous.get(metric):
+                if result[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f"{name}.{metric}: {previous[metric]} -> {result[metric]}")
+    return regressions
+
+def print_report(results):
+    header = f"{'component':<12} {'items':>5} {'cold s':>8} {'warm s':>8} {'cold/s':>8} {'warm/s':>8} {'peak MB':>8}  upstream calls (cold / warm)"
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        calls = (
+            f"{sum(result['upstream_cold']['calls'].values())} "
+            f"({sum(result['upstream_cold']['rate_limited'].values())} x 429) / "
+            f"{sum(result['upstream_warm']['calls'].values())}"
+        )
+        print(
+            f"{name:<12} {result['items']:>5} {result['cold_seconds']:>8.3f} {result['warm_seconds']:>8.3f} "
+            f"{result['cold_items_per_second']:>8.1f} {result['warm_items_per_second']:>8.1f} "
+            f"{result.get('peak_memory_mb', float('nan')):>8.2f}  {calls}"
+        )
+
+def run_benchmarks(args):
+    profile = build_profile(args)
+    server = FixtureServer(profile).start()
+    data_dir = tempfile.mkdtemp(prefix='financegpt-bench-')
+    try:
+        configure_environment(args, data_dir, server.url)
+        import app as financegpt
+
+        financegpt.yf = ReplayYFinance(load_fixture('histories.json')['symbols'], load_fixture('infos.json'), profile)
+
+        collector = financegpt.MarketDataCollector()
+        symbols = args.symbols.split(',') if args.symbols else collector.get_symbols('stocks')[:args.limit]
+        components = Components(financegpt, symbols, args.concurrency).all()
+        selected = args.components.split(',') if args.components else list(components)
+
+        results = {}
+        for name in selected:
+            setup, run = components[name]
+            results[name] = run_component(name, setup, run, profile, args.repeat, not args.no_memory)
+
+        print_report(results)
+        report = {
+            'profile': args.profile,
+            'settings': {provider: list(values) for provider, values in profile.settings.items()},
+            'symbols': len(symbols),
+            'repeat': args.repeat,
+            'python': sys.version.split()[0],
+            'components': results
+        }
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            if regressions:
+                print(f"\nRegressions beyond {args.tolerance:.0%}:")
+                for line in regressions:
+                    print(f"  {line}")
+                return 1
+        return 0
+    finally:
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def synthetic_fixtures(symbols, days=60, seed=7):
+    # Seeded random walks with the same shape as a yfinance daily download.
+    end = datetime(2026, 1, 2, tzinfo=timezone.utc)
+    histories, infos = {}, {}
+    for symbol in symbols:
+        rng = random.Random(f"{seed}:{symbol}")
+        crypto = symbol.endswith('-USD')
+        price = rng.uniform(0.5, 60000) if crypto else rng.uniform(20, 900)
+        volatility = rng.uniform(0.02, 0.06) if crypto else rng.uniform(0.008, 0.025)
+        bars = []
+        day = end - timedelta(days=days)
+        while day <= end:
+            if crypto or day.weekday() < 5:
+                open_price = price
+                price = max(price * (1 + rng.gauss(0.0005, volatility)), 1e-6)
+                high = max(open_price, price) * (1 + abs(rng.gauss(0, volatility / 2)))
+                low = min(open_price, price) * (1 - abs(rng.gauss(0, volatility / 2)))
+                volume = float(int(rng.uniform(1e6, 5e7)))
+                bars.append([int(day.timestamp()), round(open_price, 6), round(high, 6), round(low, 6), round(price, 6), volume])
+            day += timedelta(days=1)
+        histories[symbol] = bars
+        infos[symbol] = {
+            'longName': symbol.replace('-USD', '') + (' Coin' if crypto else ' Inc.'),
+            'marketCap': int(price * rng.uniform(1e8, 1e10))
+        }
+    return {'source': 'synthetic', 'seed': seed, 'symbols': histories}, infos
+
+def universe():
+    # Every symbol in the configured universe.
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as financegpt
+    return [symbol for asset_type in financegpt.symbol_universe.asset_types() for symbol in financegpt.symbol_universe.symbols(asset_type)]
+
+def write_fixture(name, payload):
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    with open(os.path.join(FIXTURES_DIR, name), 'w', encoding='utf-8') as f:
+        if isinstance(payload, str):
+            f.write(payload)
+        else:
+            json.dump(payload, f, separators=(',', ':'))
+
+def generate_fixtures(args):
+    histories, infos = synthetic_fixtures(universe())
+    write_fixture('histories.json', histories)
+    write_fixture('infos.json', infos)
+    print(f"Wrote synthetic histories for {len(infos)} symbols to {FIXTURES_DIR}")
+    return 0
+
+def record_fixtures(args):
+    # Needs network (and NEWS_API_KEY / GROQ_API_KEY for those two); anything
+    # that fails keeps its existing fixture.
+    import requests
+    import yfinance as yf
+
+    symbols = universe()
+    hist = yf.download(symbols, period='3mo', group_by='ticker', auto_adjust=True, progress=False, threads=True)
+    histories = {}
+    for symbol in symbols:
+        try:
+            frame = hist[symbol].dropna(subset=['Close'])
+        except KeyError:
+            continue
+        histories[symbol] = [
+            [int(ts.timestamp()), *(round(float(row[column]), 6) for column in ('Open', 'High', 'Low', 'Close', 'Volume'))]
+            for ts, row in frame.iterrows()
+        ]
+    if histories:
+        write_fixture('histories.json', {'source': 'yfinance', 'recorded': datetime.now().isoformat(), 'symbols': histories})
+
+    infos = {}
+    for symbol in symbols:
+        try:
+            info = yf.Ticker(symbol).info
+            infos[symbol] = {'longName': info.get('longName') or info.get('shortName'), 'marketCap': info.get('marketCap')}
+        except Exception as e:
+            print(f"info for {symbol} failed: {e}")
+    if infos:
+        write_fixture('infos.json', infos)
+
+    def templated(text, value):
+        return text.replace(value, '{query}') if value else text
+
+    try:
+        if os.getenv('NEWS_API_KEY'):
+            response = requests.get('https://newsapi.org/v2/everything', params={
+                'q': 'Apple', 'apiKey': os.getenv('NEWS_API_KEY'), 'language': 'en', 'pageSize': 20
+            }, timeout=15)
+            response.raise_for_status()
+            write_fixture('newsapi.json', json.loads(templated(response.text, 'Apple')))
+        response = requests.get('https://www.alphavantage.co/query', params={
+            'function': 'NEWS_SENTIMENT', 'tickers': 'AAPL', 'apikey': 'demo', 'limit': 10
+        }, timeout=15)
+        if 'feed' in response.json():
+            write_fixture('alpha_vantage.json', json.loads(templated(response.text, 'AAPL')))
+        response = requests.get('https://feeds.finance.yahoo.com/rss/2.0/headline', params={
+            's': 'AAPL', 'region': 'US', 'lang': 'en-US'
+        }, timeout=15)
+        response.raise_for_status()
+        write_fixture('yahoo_rss.xml', templated(response.text, 'AAPL'))
+    except Exception as e:
+        print(f"news recording failed: {e}")
+
+    print(f"Recorded fixtures into {FIXTURES_DIR}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded upstream traffic and time the data paths.")
+    parser.add_argument('command', nargs='?', default='run', choices=('run', 'fixtures', 'record'))
+    parser.add_argument('--profile', default='none', choices=sorted(PROFILES))
+    parser.add_argument('--latency', action='append', metavar='PROVIDER=SECONDS', help="override a provider's latency")
+    parser.add_argument('--rate-limit', action='append', metavar='PROVIDER=FRACTION', help="fraction of calls answered with 429")
+    parser.add_argument('--components', help="comma-separated subset of market,predictions,news")
+    parser.add_argument('--symbols', help="comma-separated symbols for predictions and news")
+    parser.add_argument('--limit', type=int, default=10, help="number of top stocks for predictions and news")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent news requests")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per component; the median is reported")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--real-limits', action='store_true', help="keep the production rate limits")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--json', help="write the full report to this file")
+    parser.add_argument('--baseline', help="report from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before a regression is reported")
+    args = parser.parse_args(argv)
+
+    if args.command == 'fixtures':
+        return generate_fixtures(args)
+    if args.command == 'record':
+        return record_fixtures(args)
+    return run_benchmarks(args)
+
+if __name__ == '__main__':
+    sys.exit(main())